@@ -4,12 +4,15 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from g4f.client import Client  # G4Fクライアントのインポート
-import logging
+from logging import getLogger
 import asyncio
+from core.messages import message_pipeline
+from core.lazy import lazy_import
 
-# ログの設定
-logging.basicConfig(level=logging.ERROR)
+# G4Fクライアント (読み込みが重いので最初の使用時にimportする)
+g4f_client = lazy_import("g4f.client")
+
+logger = getLogger(__name__)
 
 class AIChat(commands.Cog):
     def __init__(self, bot):
@@ -35,7 +38,7 @@ class AIChat(commands.Cog):
         try:
             # タイムアウト設定
             async def get_ai_response():
-                client = Client()
+                client = (await g4f_client.load()).Client()
                 response = client.chat.completions.create(
                     model="gpt-4",  # GPT-4に変更
                     messages=[{"role": "user", "content": prompt}]
@@ -71,7 +74,7 @@ class AIChat(commands.Cog):
             self.cooldowns[user_id] = discord.utils.utcnow().timestamp() + 10
 
         except RuntimeError as e:
-            logging.error(f"RuntimeError: {str(e)}")
+            logger.error(f"RuntimeError: {str(e)}")
             embed = discord.Embed(
                 title="エラー",
                 description=f"エラーが発生しました: {str(e)}",
@@ -80,7 +83,7 @@ class AIChat(commands.Cog):
             await interaction.followup.send(embed=embed, ephemeral=True)
 
         except Exception as e:
-            logging.error(f"Unexpected Error: {str(e)}")
+            logger.error(f"Unexpected Error: {str(e)}")
             embed = discord.Embed(
                 title="エラー",
                 description="予期しないエラーが発生しました。",
@@ -89,70 +92,79 @@ class AIChat(commands.Cog):
             embed.add_field(name="詳細", value=str(e))
             await interaction.followup.send(embed=embed, ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author == self.bot.user:
-            return
+    async def cog_load(self):
+        # 最後のAIの応答への返信だけを受け取る (他のBotからの返信にも応答する)
+        message_pipeline.register(
+            "ai", self.handle_message, predicate=self.is_reply_to_ai, bots=True, guild_only=True
+        )
 
-        if message.reference and message.reference.message_id:
-            guild_id = message.guild.id
+    async def cog_unload(self):
+        message_pipeline.unregister("ai")
 
-            if guild_id in self.guild_last_ai_message and message.reference.message_id == self.guild_last_ai_message[guild_id]:
-                prompt = message.content
+    def is_reply_to_ai(self, message: discord.Message) -> bool:
+        return (
+            message.author != self.bot.user
+            and message.reference is not None
+            and message.reference.message_id is not None
+            and self.guild_last_ai_message.get(message.guild.id) == message.reference.message_id
+        )
 
-                try:
-                    # タイムアウト設定
-                    async def get_ai_response():
-                        client = Client()
-                        response = client.chat.completions.create(
-                            model="gpt-4",  # GPT-4に変更
-                            messages=[{"role": "user", "content": prompt}]
-                        )
-                        return response.choices[0].message.content
-
-                    # タイピング処理を実行
-                    async with message.channel.typing():
-                        try:
-                            ai_response = await asyncio.wait_for(get_ai_response(), timeout=10)  # タイムアウトを10秒に設定
-                        except asyncio.TimeoutError:
-                            embed = discord.Embed(
-                                title="タイムアウト",
-                                description="AIとの接続がタイムアウトしました。後ほどお試しください。",
-                                color=discord.Color.red()
-                            )
-                            await message.channel.send(embed=embed)
-                            return
-
-                    # 新しいEmbedメッセージでAIの応答を返す（メンション付き）
-                    embed = discord.Embed(
-                        title="AIの応答",
-                        description=ai_response,
-                        color=discord.Color.blue()
-                    )
-                    embed.set_footer(text="Powered by GPT-4")
+    async def handle_message(self, message: discord.Message):
+        prompt = message.content
 
-                    # メンション付きで応答メッセージを送信
-                    new_message = await message.channel.send(content=f"{message.author.mention}", embed=embed)
-                    self.guild_last_ai_message[message.guild.id] = new_message.id
+        try:
+            # タイムアウト設定
+            async def get_ai_response():
+                client = (await g4f_client.load()).Client()
+                response = client.chat.completions.create(
+                    model="gpt-4",  # GPT-4に変更
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                return response.choices[0].message.content
 
-                except RuntimeError as e:
-                    logging.error(f"RuntimeError: {str(e)}")
+            # タイピング処理を実行
+            async with message.channel.typing():
+                try:
+                    ai_response = await asyncio.wait_for(get_ai_response(), timeout=10)  # タイムアウトを10秒に設定
+                except asyncio.TimeoutError:
                     embed = discord.Embed(
-                        title="エラー",
-                        description=f"エラーが発生しました: {str(e)}",
+                        title="タイムアウト",
+                        description="AIとの接続がタイムアウトしました。後ほどお試しください。",
                         color=discord.Color.red()
                     )
                     await message.channel.send(embed=embed)
+                    return
 
-                except Exception as e:
-                    logging.error(f"Unexpected Error: {str(e)}")
-                    embed = discord.Embed(
-                        title="エラー",
-                        description="予期しないエラーが発生しました。",
-                        color=discord.Color.red()
-                    )
-                    embed.add_field(name="詳細", value=str(e))
-                    await message.channel.send(embed=embed)
+            # 新しいEmbedメッセージでAIの応答を返す（メンション付き）
+            embed = discord.Embed(
+                title="AIの応答",
+                description=ai_response,
+                color=discord.Color.blue()
+            )
+            embed.set_footer(text="Powered by GPT-4")
+
+            # メンション付きで応答メッセージを送信
+            new_message = await message.channel.send(content=f"{message.author.mention}", embed=embed)
+            self.guild_last_ai_message[message.guild.id] = new_message.id
+
+        except RuntimeError as e:
+            logger.error(f"RuntimeError: {str(e)}")
+            embed = discord.Embed(
+                title="エラー",
+                description=f"エラーが発生しました: {str(e)}",
+                color=discord.Color.red()
+            )
+            await message.channel.send(embed=embed)
+
+        except Exception as e:
+            logger.error(f"Unexpected Error: {str(e)}")
+            embed = discord.Embed(
+                title="エラー",
+                description="予期しないエラーが発生しました。",
+                color=discord.Color.red()
+            )
+            embed.add_field(name="詳細", value=str(e))
+            await message.channel.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(AIChat(bot))
@@ -4,32 +4,35 @@
 import discord
 import random
 import string
-from PIL import Image
 import io
-from captcha.image import ImageCaptcha
 from discord import app_commands
 from discord.ext import commands
 from core.connect import db  # PostgreSQL接続をインポート
+from core.guildconfig import guild_config
+from core.router import component_router
+from core.lazy import lazy_import
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+Image = lazy_import("PIL.Image")
+captcha_image = lazy_import("captcha.image")
 
 class AuthCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.image_captcha = ImageCaptcha()
+        self.image_captcha = None  # 最初の認証時に作成する
         self.generated_captcha_image = None
         self.captcha_text = None
 
-        # 初回起動時にテーブルを作成
-        self.bot.loop.create_task(self.init_db())
+    async def cog_load(self):
+        component_router.register("image_au", self.show_blurred_captcha)
+        component_router.register("picture", self.show_captcha)
+        component_router.register("phot_au", self.open_answer_form)
 
-    async def init_db(self):
-        query = """
-        CREATE TABLE IF NOT EXISTS auth_roles (
-            guild_id BIGINT,
-            role_id BIGINT,
-            PRIMARY KEY (guild_id, role_id)
-        )
-        """
-        await db.execute_query(query)
+    async def cog_unload(self):
+        for custom_id in ("image_au", "picture", "phot_au"):
+            component_router.unregister(custom_id)
 
     @app_commands.command(name="auth", description="AUTHENTICATION PANEL")
     @app_commands.describe(role="認証完了時に付与するロール")
@@ -47,68 +50,62 @@ class AuthCog(commands.Cog):
         ON CONFLICT (guild_id, role_id) DO NOTHING
         """
         await db.execute_query(query, (interaction.guild.id, role.id))
+        await guild_config.refresh("auth_roles", interaction.guild.id)
 
         await interaction.response.send_message(":white_check_mark:", ephemeral=True)
         await ch.send(embed=embed, view=view)
 
-    @commands.Cog.listener()
-    async def on_interaction(self, interaction: discord.Interaction):
-        try:
-            if interaction.data['component_type'] == 2:
-                await self.on_button_click(interaction)
-        except KeyError:
-            pass
-
-    async def on_button_click(self, interaction: discord.Interaction):
-        custom_id = interaction.data["custom_id"]
-        if custom_id == "image_au":
-            captcha_text = ''.join(random.choices(string.ascii_letters + string.digits, k=5))
-            original = self.image_captcha.generate(captcha_text)
-            intensity = 20
-            img = Image.open(original)
-            small = img.resize(
-                (round(img.width / intensity), round(img.height / intensity))
-            )
-            blur = small.resize(
-                (img.width, img.height),
-                resample=Image.BILINEAR
-            )
-            embed = discord.Embed()
-            button = discord.ui.Button(label="表示する", style=discord.ButtonStyle.primary, custom_id="picture")
-            view = discord.ui.View()
-            view.add_item(button)
+    async def show_blurred_captcha(self, interaction: discord.Interaction):
+        if self.image_captcha is None:
+            await captcha_image.load()
+            self.image_captcha = captcha_image.ImageCaptcha()
+        captcha_text = ''.join(random.choices(string.ascii_letters + string.digits, k=5))
+        original = self.image_captcha.generate(captcha_text)
+        intensity = 20
+        img = Image.open(original)
+        small = img.resize(
+            (round(img.width / intensity), round(img.height / intensity))
+        )
+        blur = small.resize(
+            (img.width, img.height),
+            resample=Image.BILINEAR
+        )
+        embed = discord.Embed()
+        button = discord.ui.Button(label="表示する", style=discord.ButtonStyle.primary, custom_id="picture")
+        view = discord.ui.View()
+        view.add_item(button)
+        with io.BytesIO() as image_binary:
+            blur.save(image_binary, 'PNG')
+            image_binary.seek(0)
+            file = discord.File(fp=image_binary, filename="captcha_img.png")
+            embed.set_image(url="attachment://captcha_img.png")
+            await interaction.response.send_message(file=file, embed=embed, view=view, ephemeral=True)
+        
+        # 生成された画像を次の処理でも使用できるように保存
+        self.generated_captcha_image = img
+        self.captcha_text = captcha_text  # captcha_textを保存
+
+    async def show_captcha(self, interaction: discord.Interaction):
+        embed = discord.Embed()
+
+        button = discord.ui.Button(label="認証", style=discord.ButtonStyle.success, custom_id="phot_au")
+        view = discord.ui.View()
+        view.add_item(button)
+
+        if self.generated_captcha_image:
             with io.BytesIO() as image_binary:
-                blur.save(image_binary, 'PNG')
+                self.generated_captcha_image.save(image_binary, 'PNG')
                 image_binary.seek(0)
-                file = discord.File(fp=image_binary, filename="captcha_img.png")
+                file = discord.File(image_binary, filename="captcha_img.png")
                 embed.set_image(url="attachment://captcha_img.png")
-                await interaction.response.send_message(file=file, embed=embed, view=view, ephemeral=True)
-            
-            # 生成された画像を次の処理でも使用できるように保存
-            self.generated_captcha_image = img
-            self.captcha_text = captcha_text  # captcha_textを保存
-        
-        elif custom_id == "picture":
-            embed = discord.Embed()
-
-            button = discord.ui.Button(label="認証", style=discord.ButtonStyle.success, custom_id="phot_au")
-            view = discord.ui.View()
-            view.add_item(button)
-
-            if self.generated_captcha_image:
-                with io.BytesIO() as image_binary:
-                    self.generated_captcha_image.save(image_binary, 'PNG')
-                    image_binary.seek(0)
-                    file = discord.File(image_binary, filename="captcha_img.png")
-                    embed.set_image(url="attachment://captcha_img.png")
-                    await interaction.response.edit_message(attachments=[file], view=view, embed=embed)
-            else:
-                await interaction.response.send_message("エラー: 画像が見つかりません。", ephemeral=True)
-        
-        elif custom_id == "phot_au":
-            # Questionnaireクラスにcaptcha_textを渡す
-            questionnaire = Questionnaire(captcha_text=self.captcha_text)
-            await interaction.response.send_modal(questionnaire)
+                await interaction.response.edit_message(attachments=[file], view=view, embed=embed)
+        else:
+            await interaction.response.send_message("エラー: 画像が見つかりません。", ephemeral=True)
+
+    async def open_answer_form(self, interaction: discord.Interaction):
+        # Questionnaireクラスにcaptcha_textを渡す
+        questionnaire = Questionnaire(captcha_text=self.captcha_text)
+        await interaction.response.send_modal(questionnaire)
 
 class Questionnaire(discord.ui.Modal):
     auth_answer = discord.ui.TextInput(label='認証コードを入力してください', style=discord.TextStyle.short, min_length=4, max_length=7)
@@ -119,14 +116,14 @@ class Questionnaire(discord.ui.Modal):
 
     async def on_submit(self, interaction: discord.Interaction):
         answer = self.auth_answer.value
-        print(f"DEBUG: captcha_text = '{self.captcha_text}', answer = '{answer}'")  # ここでconsoleに出力
+        # 正解や入力値はログに残さない
+        logger.debug(f"Captcha answer submitted in guild {interaction.guild.id}: {'correct' if answer == self.captcha_text else 'wrong'}")
         if answer == self.captcha_text:
             embed = discord.Embed(description="**認証に成功しました！**", title=None)
             # ロールを付与
-            query = "SELECT role_id FROM auth_roles WHERE guild_id = $1"
-            role_id = await db.execute_query(query, (interaction.guild.id,))
-            if role_id:
-                role = interaction.guild.get_role(role_id[0][0])
+            auth_roles = guild_config.get("auth_roles", interaction.guild.id)
+            if auth_roles:
+                role = interaction.guild.get_role(auth_roles[0]['role_id'])
                 if role:
                     await interaction.user.add_roles(role)
             await interaction.response.send_message(embed=embed, ephemeral=True)
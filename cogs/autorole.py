@@ -5,28 +5,19 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from core.connect import db  # Import the global db instance
+from core.guildconfig import guild_config
+from logging import getLogger
 
-async def initialize_db():
-    try:
-        create_autoroles_table = """
-            CREATE TABLE IF NOT EXISTS autoroles (
-                server_id BIGINT PRIMARY KEY,
-                role_ids TEXT
-            )
-        """
-        await db.execute_query(create_autoroles_table)
-    except Exception as e:
-        print(f"データベースの初期化中にエラーが発生しました: {e}")
+logger = getLogger(__name__)
 
 async def get_autoroles(server_id):
     try:
-        query = "SELECT role_ids FROM autoroles WHERE server_id = $1"
-        result = await db.execute_query(query, (server_id,))
-        if result:
-            return result[0]['role_ids'].split(",")
+        settings = guild_config.get("autoroles", server_id)
+        if settings and settings['role_ids']:
+            return settings['role_ids']
         return []
     except Exception as e:
-        print(f"自動ロールの取得中にエラーが発生しました: {e}")
+        logger.error(f"自動ロールの取得中にエラーが発生しました: {e}")
         return []
 
 async def set_autoroles(server_id, role_ids):
@@ -36,40 +27,43 @@ async def set_autoroles(server_id, role_ids):
             VALUES ($1, $2)
             ON CONFLICT (server_id) DO UPDATE SET role_ids = EXCLUDED.role_ids
         """
-        await db.execute_query(query, (server_id, ",".join(role_ids)))
+        await db.execute_query(query, (server_id, role_ids))
+        await guild_config.refresh("autoroles", server_id)
     except Exception as e:
-        print(f"自動ロールの設定中にエラーが発生しました: {e}")
+        logger.error(f"自動ロールの設定中にエラーが発生しました: {e}")
 
 async def remove_autoroles(server_id):
     try:
         query = "DELETE FROM autoroles WHERE server_id = $1"
         await db.execute_query(query, (server_id,))
+        await guild_config.refresh("autoroles", server_id)
     except Exception as e:
-        print(f"自動ロールの削除中にエラーが発生しました: {e}")
+        logger.error(f"自動ロールの削除中にエラーが発生しました: {e}")
 
 class AutoRole(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        bot.loop.create_task(initialize_db())
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
         try:
             role_ids = await get_autoroles(member.guild.id)
+            if not role_ids:
+                return
             roles = [
-                member.guild.get_role(int(role_id))
+                member.guild.get_role(role_id)
                 for role_id in role_ids
-                if member.guild.get_role(int(role_id))
+                if member.guild.get_role(role_id)
             ]
             if roles:
                 await member.add_roles(*roles)
-                print(
+                logger.info(
                     f"{member.display_name} に自動ロールを付与しました: {', '.join([role.name for role in roles])}"
                 )
             else:
-                print(f"{member.display_name} に付与するロールが設定されていません。")
+                logger.debug(f"{member.display_name} に付与するロールが設定されていません。")
         except Exception as e:
-            print(f"メンバー入室時のエラー: {e}")
+            logger.error(f"メンバー入室時のエラー: {e}")
 
     @app_commands.command(name="autorole_set", description="自動ロールを設定します。")
     @app_commands.describe(roles="自動付与するロールを選択してください。")
@@ -78,13 +72,13 @@ class AutoRole(commands.Cog):
         await interaction.response.defer()
         try:
             role_ids = (
-                [str(roles.id)]
+                [roles.id]
                 if isinstance(roles, discord.Role)
-                else [str(role.id) for role in roles]
+                else [role.id for role in roles]
             )
             await set_autoroles(interaction.guild.id, role_ids)
             await interaction.followup.send(
-                f"自動ロールを設定しました: {', '.join([interaction.guild.get_role(int(role_id)).name for role_id in role_ids])}"
+                f"自動ロールを設定しました: {', '.join([interaction.guild.get_role(role_id).name for role_id in role_ids])}"
             )
         except Exception as e:
             await interaction.followup.send(f"エラーが発生しました: {e}")
@@ -100,13 +94,13 @@ class AutoRole(commands.Cog):
         await interaction.response.defer()
         try:
             role_ids = (
-                [str(roles.id)]
+                [roles.id]
                 if isinstance(roles, discord.Role)
-                else [str(role.id) for role in roles]
+                else [role.id for role in roles]
             )
             await set_autoroles(interaction.guild.id, role_ids)
             await interaction.followup.send(
-                f"自動ロールを変更しました: {', '.join([interaction.guild.get_role(int(role_id)).name for role_id in role_ids])}"
+                f"自動ロールを変更しました: {', '.join([interaction.guild.get_role(role_id).name for role_id in role_ids])}"
             )
         except Exception as e:
             await interaction.followup.send(f"エラーが発生しました: {e}")
@@ -4,6 +4,18 @@
 import discord
 import random
 from discord.ext import commands
+from core.messages import message_pipeline
+
+PHRASES = (
+    "おふろめんどくさい",
+    "お風呂めんどくさい",
+    "お風呂めんどくちゃい",
+    "おふろめんどくちゃい",
+    "おふろやだ",
+    "お風呂やだ",
+    "お風呂入りたくない",
+    "おふろはいりたくない",
+)
 
 class Bath(commands.Cog):
     def __init__(self, bot):
@@ -71,14 +83,16 @@ class Bath(commands.Cog):
                 "お風呂の後は、ぽかぽかして気持ちいいよ！"
         ]
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def cog_load(self):
+        # フレーズの検索はパイプラインのキーワード検索でまとめて行う
+        message_pipeline.register("bath", self.handle_message, keywords=PHRASES)
+
+    async def cog_unload(self):
+        message_pipeline.unregister("bath")
 
-        if any(phrase in message.content for phrase in ["おふろめんどくさい", "お風呂めんどくさい", "お風呂めんどくちゃい",  "おふろめんどくちゃい" "おふろやだ", "お風呂やだ", "お風呂入りたくない", "おふろはいりたくない"]):
-            response = random.choice(self.responses)
-            await message.reply(response, mention_author=True)
+    async def handle_message(self, message):
+        response = random.choice(self.responses)
+        await message.reply(response, mention_author=True)
 
 async def setup(bot):
     await bot.add_cog(Bath(bot))
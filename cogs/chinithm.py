@@ -3,10 +3,12 @@
 
 import os
 import discord
-import requests
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
+from core.lazy import lazy_import
+
+requests = lazy_import("requests")
 
 # .envファイルからトークンを読み込み
 load_dotenv()
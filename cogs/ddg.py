@@ -5,8 +5,10 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import aiohttp
-from bs4 import BeautifulSoup
 import urllib.parse
+from core.lazy import lazy_import
+
+bs4 = lazy_import("bs4")
 
 class DuckDuckGo(commands.Cog):
     def __init__(self, bot):
@@ -28,7 +30,7 @@ class DuckDuckGo(commands.Cog):
                 html = await response.text()
 
         # BeautifulSoupを使用してリンクを解析
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = bs4.BeautifulSoup(html, 'html.parser')
         results = []
 
         # 検索結果のリンクを取得
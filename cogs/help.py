@@ -4,15 +4,15 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import os
-import importlib.util
-import inspect
+from core.catalog import command_catalog
 
 class HelpMenu(discord.ui.View):
     def __init__(self, embeds, timeout=60):
         super().__init__(timeout=timeout)
         self.embeds = embeds
         self.current_page = 0
+        # 1ページしかない場合は次へも押せないようにする
+        self.children[1].disabled = len(embeds) <= 1
 
     @discord.ui.button(label="Previous", style=discord.ButtonStyle.primary, disabled=True)
     async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -37,50 +37,8 @@ class HelpCommand(commands.Cog):
 
     @app_commands.command(name="help", description="すべてのスラッシュコマンドとその説明を表示します。")
     async def help(self, interaction: discord.Interaction):
-        embeds = []
-        embed = discord.Embed(
-            title="ヘルプ",
-            description="使用可能なスラッシュコマンド一覧",
-            color=0x00FF00,
-        )
-
-        commands_folder = "./cogs"
-        field_count = 0
-
-        for file in os.listdir(commands_folder):
-            if file.endswith(".py"):
-                module_name = file[:-3]
-                module_path = os.path.join(commands_folder, file)
-
-                spec = importlib.util.spec_from_file_location(module_name, module_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-
-                for name, obj in vars(module).items():
-                    if inspect.isclass(obj) and issubclass(obj, commands.Cog):
-                        cog = obj(self.bot)
-                        for command in cog.__cog_app_commands__:
-                            embed.add_field(
-                                name=f"/{command.name}",
-                                value=command.description or "説明なし",
-                                inline=False,
-                            )
-                            field_count += 1
-
-                            # 25フィールドごとに新しいEmbedを作成
-                            if field_count == 25:
-                                embeds.append(embed)
-                                embed = discord.Embed(
-                                    title="ヘルプ",
-                                    description="使用可能なスラッシュコマンド一覧",
-                                    color=0x00FF00,
-                                )
-                                field_count = 0
-
-        # 最後のEmbedを追加
-        if field_count > 0:
-            embeds.append(embed)
-
+        # ページはコマンド一覧が変わったときだけ作り直される (core.catalog)
+        embeds = command_catalog.help_pages()
         view = HelpMenu(embeds)
 
         await interaction.response.send_message(embed=embeds[0], view=view, ephemeral=True)
@@ -6,6 +6,7 @@ from discord import app_commands
 from discord.ext import commands
 import random
 import asyncio
+from core.messages import message_pipeline
 
 class HitAndBlowServer(commands.Cog):
     def __init__(self, bot):
@@ -39,11 +40,19 @@ class HitAndBlowServer(commands.Cog):
 
         await interaction.response.send_message(embed=embed)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot or not message.guild:
-            return
+    async def cog_load(self):
+        # ゲーム中のサーバーのメッセージだけを受け取る
+        message_pipeline.register(
+            "hitandblow_server",
+            self.handle_message,
+            predicate=lambda message: message.guild.id in self.sessions,
+            guild_only=True,
+        )
+
+    async def cog_unload(self):
+        message_pipeline.unregister("hitandblow_server")
 
+    async def handle_message(self, message):
         session = self.sessions.get(message.guild.id)
         if not session:
             return
@@ -5,6 +5,10 @@ import discord
 from discord.ext import commands
 from discord import app_commands, ui
 from core.connect import db
+from core.guildconfig import guild_config
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 class InviteTracker(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
@@ -20,33 +24,13 @@ class InviteTracker(commands.Cog):
             try:
                 self.invites[guild.id] = await guild.invites()
             except Exception as e:
-                print(f"Failed to load invites for {guild.name} ({guild.id}): {e}")
+                logger.warning(f"Failed to load invites for {guild.name} ({guild.id}): {e}")
 
     def find_invite_by_code(self, inv_list, code):
         for inv in inv_list:
             if inv.code == code:
                 return inv
 
-    async def init_db(self) -> None:
-        # データベースの初期化とマイグレーション
-        await db.execute_query("""
-        CREATE TABLE IF NOT EXISTS invite_tracker_settings (
-            guild_id BIGINT PRIMARY KEY,
-            is_enabled BOOLEAN NOT NULL,
-            channel_id BIGINT
-        );
-        """)
-        
-        await db.execute_query("""
-        CREATE TABLE IF NOT EXISTS invite_tracker (
-            guild_id BIGINT NOT NULL,
-            user_id BIGINT NOT NULL,
-            inviter_id BIGINT,
-            invites INT DEFAULT 0,
-            PRIMARY KEY (guild_id, user_id)
-        );
-        """)
-
     async def check_if_enabled(self, interaction: discord.Interaction) -> bool:
         # 機能が有効かどうかを確認する関数
         settings = await self.get_server_settings(interaction.guild.id)
@@ -62,8 +46,7 @@ class InviteTracker(commands.Cog):
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
-        await self.init_db()
-        print("InviteTrackerが起動しました。")
+        logger.info("InviteTrackerが起動しました。")
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
@@ -108,27 +91,33 @@ class InviteTracker(commands.Cog):
                 await channel.send(embed=embed)
 
     @commands.Cog.listener()
-    async def on_member_remove(self, member: discord.Member) -> None:
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent) -> None:
+        # メンバーキャッシュが無効でも届くようにrawイベントを使う
+        guild = self.bot.get_guild(payload.guild_id)
+        user = payload.user
+        if guild is None:
+            return
+
         # サーバー設定を取得
-        settings = await self.get_server_settings(member.guild.id)
+        settings = await self.get_server_settings(guild.id)
         if not settings or not settings['is_enabled']:
             return
     
-        inviter_id = await self.get_inviter(member.guild.id, member.id)
+        inviter_id = await self.get_inviter(guild.id, user.id)
         if inviter_id:
             # 招待数をデクリメント
-            await self.decrement_invite(member.guild.id, inviter_id)
+            await self.decrement_invite(guild.id, inviter_id)
     
         # メッセージ送信
         if settings['channel_id']:
-            channel = member.guild.get_channel(settings['channel_id'])
+            channel = guild.get_channel(settings['channel_id'])
             if channel:
-                inviter = member.guild.get_member(inviter_id) if inviter_id else None
-                inviter_mention = inviter.mention if inviter else "不明な招待者"
+                # 招待者がキャッシュにいなくてもメンションは作れる
+                inviter_mention = f"<@{inviter_id}>" if inviter_id else "不明な招待者"
     
                 embed = discord.Embed(
-                    title=f"{member.name}さんが{member.guild.name}を退出しました。",
-                    description=f"{member.mention}は{inviter_mention}からの招待でした。現在{await self.get_invite_count(member.guild.id, inviter_id)}人招待しています。" if inviter_id else f"{member.mention}の招待者は不明です。",
+                    title=f"{user.name}さんが{guild.name}を退出しました。",
+                    description=f"{user.mention}は{inviter_mention}からの招待でした。現在{await self.get_invite_count(guild.id, inviter_id)}人招待しています。" if inviter_id else f"{user.mention}の招待者は不明です。",
                     color=discord.Color.red()
                 )
                 await channel.send(embed=embed)    
@@ -203,56 +192,53 @@ class InviteTracker(commands.Cog):
 
     # Helper Methods for DB Operations
     async def get_server_settings(self, guild_id: int) -> dict:
-        result = await db.execute_query("SELECT is_enabled, channel_id FROM invite_tracker_settings WHERE guild_id = $1", (guild_id,))
-        if result:
-            return {'is_enabled': result[0]['is_enabled'], 'channel_id': result[0]['channel_id']}  # 辞書形式で返す
-        return None
+        # 設定はキャッシュから辞書形式で返す
+        return guild_config.get("invite_tracker_settings", guild_id)
 
     async def update_server_settings(self, guild_id: int, is_enabled: bool, channel_id: int) -> None:
-        await db.execute_query("""
+        await db.execute("""
         INSERT INTO invite_tracker_settings (guild_id, is_enabled, channel_id) VALUES ($1, $2, $3)
         ON CONFLICT (guild_id) DO UPDATE SET is_enabled = EXCLUDED.is_enabled, channel_id = EXCLUDED.channel_id
-        """, (guild_id, is_enabled, channel_id))
+        """, guild_id, is_enabled, channel_id)
+        await guild_config.refresh("invite_tracker_settings", guild_id)
 
     async def add_invite(self, guild_id: int, user_id: int, inviter_id: int) -> None:
         # 招待者が既にデータベースに存在するか確認
-        existing_invite = await db.execute_query("""
+        current_invites = await db.fetchval("""
         SELECT invites FROM invite_tracker WHERE guild_id = $1 AND inviter_id = $2
-        """, (guild_id, inviter_id))
+        """, guild_id, inviter_id)
     
-        if existing_invite:
-            current_invites = existing_invite[0]['invites']
+        if current_invites is not None:
     
             # 招待数が0未満の場合、0に補正
             if current_invites < 0:
                 current_invites = 0
     
             # 招待数をインクリメント
-            await db.execute_query("""
+            await db.execute("""
             UPDATE invite_tracker SET invites = $1 WHERE guild_id = $2 AND inviter_id = $3
-            """, (current_invites + 1, guild_id, inviter_id))
+            """, current_invites + 1, guild_id, inviter_id)
         else:
             # 新しいレコードを作成
-            await db.execute_query("""
+            await db.execute("""
             INSERT INTO invite_tracker (guild_id, user_id, inviter_id, invites) 
             VALUES ($1, $2, $3, 1)
-            """, (guild_id, user_id, inviter_id))
+            """, guild_id, user_id, inviter_id)
 
 
 
     async def get_inviter(self, guild_id: int, user_id: int) -> int:
-        result = await db.execute_query("SELECT inviter_id FROM invite_tracker WHERE guild_id = $1 AND user_id = $2", (guild_id, user_id))
-        return result[0]['inviter_id'] if result else None
+        return await db.fetchval("SELECT inviter_id FROM invite_tracker WHERE guild_id = $1 AND user_id = $2", guild_id, user_id)
 
     async def decrement_invite(self, guild_id: int, inviter_id: int) -> None:
-        await db.execute_query("UPDATE invite_tracker SET invites = invites - 1 WHERE guild_id = $1 AND inviter_id = $2", (guild_id, inviter_id))
+        await db.execute("UPDATE invite_tracker SET invites = invites - 1 WHERE guild_id = $1 AND inviter_id = $2", guild_id, inviter_id)
 
     async def get_invite_count(self, guild_id: int, user_id: int) -> int:
-        result = await db.execute_query("SELECT invites FROM invite_tracker WHERE guild_id = $1 AND user_id = $2", (guild_id, user_id))
-        return result[0]['invites'] if result else 0
+        result = await db.fetchval("SELECT invites FROM invite_tracker WHERE guild_id = $1 AND user_id = $2", guild_id, user_id)
+        return result if result is not None else 0
 
     async def get_server_ranking(self, guild_id: int) -> list:
-        return await db.execute_query("SELECT guild_id, user_id, invites FROM invite_tracker WHERE guild_id = $1 ORDER BY invites DESC", (guild_id,))
+        return await db.fetch("SELECT guild_id, user_id, invites FROM invite_tracker WHERE guild_id = $1 ORDER BY invites DESC", guild_id)
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(InviteTracker(bot))
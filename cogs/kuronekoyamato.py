@@ -2,9 +2,14 @@
 # Author: Miriel (@mirielnet)
 
 import discord
-import requests
 from discord import app_commands
 from discord.ext import commands
+from core.lazy import lazy_import
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+requests = lazy_import("requests")
 
 
 class KuronekoYamato(commands.Cog):
@@ -73,13 +78,11 @@ class KuronekoYamato(commands.Cog):
 
             await interaction.followup.send(embed=embed)
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching tracking info: {e}")
+            logger.error(f"Error fetching tracking info: {e}")
             await interaction.followup.send(
                 "追跡番号の情報を取得する際にエラーが発生しました。", ephemeral=True
             )
 
 
 async def setup(bot):
-    print("Setting up KuronekoYamato Cog")
     await bot.add_cog(KuronekoYamato(bot))
-    print("KuronekoYamato Cog setup complete")
@@ -1,47 +1,137 @@
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 # Author: Miriel (@mirielnet)
 
+import asyncio
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 from core.connect import db  # Import the global db instance
+from core.guildconfig import guild_config
+from core.messages import message_pipeline
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+XP_GAIN = 0.5  # XPの増加量は任意で調整可能
+FLUSH_INTERVAL = 30  # XPをデータベースへ書き込む間隔 (秒)
+
+def get_level(xp: float) -> int:
+    return min(100, int(xp ** (1 / 2.5)))
+
+class XPAccumulator:
+    """ユーザーごとのXPをメモリ上で加算し、定期的にまとめてusersテーブルへ書き込みます。"""
+
+    def __init__(self) -> None:
+        # (server_id, user_id) -> [xp, level, 未書き込みのXP, 前回の書き込み以降に更新されたか]
+        self.entries = {}
+        self.flush_lock = asyncio.Lock()
+
+    async def add(self, server_id: int, user_id: int, amount: float):
+        """XPを加算し、レベルが上がった場合は新しいレベルを返します。"""
+        key = (server_id, user_id)
+        entry = self.entries.get(key)
+        if entry is None:
+            row = await db.fetchrow(
+                "SELECT xp, level FROM users WHERE user_id = $1 AND server_id = $2",
+                user_id,
+                server_id,
+            )
+            # 読み込み中に同じユーザーの別メッセージが先に登録している場合がある
+            entry = self.entries.get(key)
+            if entry is None:
+                if row is None:
+                    # 初回のメッセージはレベル1で登録する
+                    entry = self.entries[key] = [amount, 1, amount, True]
+                    return None
+                entry = self.entries[key] = [row['xp'], row['level'], 0.0, True]
+
+        level = entry[1]
+        entry[0] += amount
+        entry[1] = get_level(entry[0])
+        entry[2] += amount
+        entry[3] = True
+        return entry[1] if entry[1] > level else None
+
+    def get(self, server_id: int, user_id: int):
+        entry = self.entries.get((server_id, user_id))
+        return (entry[0], entry[1]) if entry else None
+
+    def discard_server(self, server_id: int) -> None:
+        for key in [key for key in self.entries if key[0] == server_id]:
+            del self.entries[key]
+
+    async def flush(self) -> None:
+        """未書き込みのXPを1回のバッチUPSERTでまとめて書き込みます。"""
+        async with self.flush_lock:
+            batch = []
+            for key, entry in list(self.entries.items()):
+                if entry[2]:
+                    batch.append((key, entry[2], entry[1]))
+                    entry[2] = 0.0
+                elif not entry[3]:
+                    # 1周期のあいだ更新がなかったユーザーはメモリから外す
+                    del self.entries[key]
+                    continue
+                entry[3] = False
+
+            if not batch:
+                return
 
-def setup_db() -> None:
-    create_users_table = """
-        CREATE TABLE IF NOT EXISTS users (
-            user_id BIGINT,
-            server_id BIGINT,
-            xp FLOAT DEFAULT 0,
-            level INT DEFAULT 1,
-            PRIMARY KEY (user_id, server_id)
-        )
-    """
-    create_settings_table = """
-        CREATE TABLE IF NOT EXISTS settings (
-            server_id BIGINT PRIMARY KEY,
-            level_enabled BOOLEAN DEFAULT FALSE,
-            notify_channel_id BIGINT
-        )
-    """
-    db.execute_query(create_users_table)
-    db.execute_query(create_settings_table)
+            try:
+                await db.executemany(
+                    """
+                    INSERT INTO users (user_id, server_id, xp, level) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (user_id, server_id)
+                    DO UPDATE SET xp = users.xp + EXCLUDED.xp, level = EXCLUDED.level
+                    """,
+                    [(user_id, server_id, pending, level) for (server_id, user_id), pending, level in batch],
+                )
+            except BaseException:
+                # 失敗したXPは次回の書き込みに持ち越す (キャンセルされた場合も0にしたままにしない)
+                for key, pending, _ in batch:
+                    entry = self.entries.get(key)
+                    if entry is not None:
+                        entry[2] += pending
+                        entry[3] = True
+                raise
 
 class LevelSystem(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
+        self.xp = XPAccumulator()
+
+    async def cog_load(self) -> None:
+        self.flush_xp.start()
+        # 無効なサーバーではハンドラー自体を呼ばない
+        message_pipeline.register(
+            "level", self.handle_message, predicate=self.is_enabled, guild_only=True
+        )
+
+    async def cog_unload(self) -> None:
+        message_pipeline.unregister("level")
+        # 実行中の書き込みが終わるのを待ってから止め、書き込みの途中でキャンセルしない
+        async with self.xp.flush_lock:
+            self.flush_xp.cancel()
+        # 終了時に残りのXPを書き込む
+        await self.xp.flush()
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def flush_xp(self) -> None:
+        try:
+            await self.xp.flush()
+        except Exception as e:
+            logger.error(f"XPの書き込み中にエラーが発生しました: {e}")
 
     def get_level(self, xp: float) -> int:
-        return min(100, int(xp ** (1 / 2.5)))
+        return get_level(xp)
 
     async def handle_error(self, interaction: discord.Interaction, error_message: str) -> None:
         embed = discord.Embed(title="エラー", description=error_message, color=0xFF0000)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
     async def check_level_enabled(self, interaction: discord.Interaction) -> bool:
-        server_id = interaction.guild.id
-        query = "SELECT level_enabled FROM settings WHERE server_id = $1"
-        result = await db.execute_query(query, (server_id,))
-        if not result or not result[0]['level_enabled']:
+        settings = guild_config.get("settings", interaction.guild.id)
+        if not settings or not settings['level_enabled']:
             await self.handle_error(
                 interaction,
                 "レベル機能が無効になっています。サーバー管理者にお問い合わせください。",
@@ -59,13 +149,18 @@ class LevelSystem(commands.Cog):
 
         try:
             query = "SELECT xp, level FROM users WHERE user_id = $1 AND server_id = $2"
-            result = await db.execute_query(query, (user_id, server_id))
+            result = await db.fetchrow(query, user_id, server_id)
 
             if result:
-                xp, level = result[0]['xp'], result[0]['level']
+                xp, level = result['xp'], result['level']
             else:
                 xp, level = 0, 1
 
+            # まだ書き込まれていないXPを反映する
+            pending = self.xp.get(server_id, user_id)
+            if pending:
+                xp, level = pending
+
             embed = discord.Embed(
                 title="レベル",
                 description=f"{interaction.user.name}さんのレベル情報",
@@ -90,13 +185,14 @@ class LevelSystem(commands.Cog):
         server_id = interaction.guild.id
 
         try:
+            await self.xp.flush()
             query = """
                 SELECT user_id, level, xp FROM users 
                 WHERE server_id = $1 
                 ORDER BY level DESC, xp DESC 
                 LIMIT 10
             """
-            rankings = await db.execute_query(query, (server_id,))
+            rankings = await db.fetch(query, server_id)
 
             embed = discord.Embed(
                 title="レベルランキング",
@@ -138,8 +234,11 @@ class LevelSystem(commands.Cog):
 
         try:
             if not enable:
-                delete_users_query = "DELETE FROM users WHERE server_id = $1"
-                await db.execute_query(delete_users_query, (server_id,))
+                # 書き込み中のバッチが削除後の行を復活させないようにロックする
+                async with self.xp.flush_lock:
+                    self.xp.discard_server(server_id)
+                    delete_users_query = "DELETE FROM users WHERE server_id = $1"
+                    await db.execute(delete_users_query, server_id)
 
             replace_settings_query = """
                 INSERT INTO settings (server_id, level_enabled, notify_channel_id)
@@ -147,11 +246,13 @@ class LevelSystem(commands.Cog):
                 ON CONFLICT (server_id) 
                 DO UPDATE SET level_enabled = EXCLUDED.level_enabled, notify_channel_id = EXCLUDED.notify_channel_id
             """
-            await db.execute_query(replace_settings_query, (
+            await db.execute(
+                replace_settings_query,
                 server_id,
                 enable,
                 notify_channel.id if notify_channel else None,
-            ))
+            )
+            await guild_config.refresh("settings", server_id)
 
             status = "有効" if enable else "無効"
             embed = discord.Embed(
@@ -167,47 +268,28 @@ class LevelSystem(commands.Cog):
         except Exception as e:
             await self.handle_error(interaction, "設定の更新中にエラーが発生しました。")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
-        if message.author.bot:
-            return
+    def is_enabled(self, message: discord.Message) -> bool:
+        settings = guild_config.get("settings", message.guild.id)
+        return bool(settings and settings['level_enabled'])
 
+    async def handle_message(self, message: discord.Message) -> None:
         server_id = message.guild.id
         user_id = message.author.id
+        settings = guild_config.get("settings", server_id)
 
         try:
-            query = "SELECT level_enabled FROM settings WHERE server_id = $1"
-            result = await db.execute_query(query, (server_id,))
-
-            if not result or not result[0]['level_enabled']:
-                return
-
-            xp_gain = 0.5  # XPの増加量は任意で調整可能
-            select_user_query = "SELECT xp, level FROM users WHERE user_id = $1 AND server_id = $2"
-            result = await db.execute_query(select_user_query, (user_id, server_id))
-
-            if result:
-                xp, level = result[0]['xp'], result[0]['level']
-                new_xp = xp + xp_gain
-                new_level = self.get_level(new_xp)
-
-                if new_level > level:
-                    select_notify_channel_query = "SELECT notify_channel_id FROM settings WHERE server_id = $1"
-                    channel_id = (await db.execute_query(select_notify_channel_query, (server_id,)))[0]['notify_channel_id']
-                    if channel_id:
-                        channel = self.bot.get_channel(channel_id)
-                        if channel:
-                            msg = f"{message.author.mention} レベルが{new_level}に上がりました！ おめでとうございます！"
-                            await channel.send(msg)
-
-                update_user_query = "UPDATE users SET xp = $1, level = $2 WHERE user_id = $3 AND server_id = $4"
-                await db.execute_query(update_user_query, (new_xp, new_level, user_id, server_id))
-            else:
-                insert_user_query = "INSERT INTO users (user_id, server_id, xp, level) VALUES ($1, $2, $3, 1)"
-                await db.execute_query(insert_user_query, (user_id, server_id, xp_gain))
-
+            new_level = await self.xp.add(server_id, user_id, XP_GAIN)
+
+            # レベルアップはメモリ上で判定するので通知はすぐに送られる
+            if new_level:
+                channel_id = settings['notify_channel_id']
+                if channel_id:
+                    channel = self.bot.get_channel(channel_id)
+                    if channel:
+                        msg = f"{message.author.mention} レベルが{new_level}に上がりました！ おめでとうございます！"
+                        await channel.send(msg)
         except Exception as e:
-            print(f"XPの更新中にエラーが発生しました: {e}")
+            logger.error(f"XPの更新中にエラーが発生しました: {e}")
 
 async def setup(bot: commands.Bot) -> None:
     await bot.add_cog(LevelSystem(bot))
@@ -4,20 +4,26 @@
 import discord
 from discord.ext import commands
 import re
+from core.messages import message_pipeline
+
+# メッセージリンクの正規表現パターン
+MESSAGE_LINK_PATTERN = re.compile(r"https://discord\.com/channels/(\d+)/(\d+)/(\d+)")
 
 class MessageLinkListener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        # Botが送信したメッセージは無視する
-        if message.author.bot:
-            return
-        
-        # メッセージリンクの正規表現パターン
-        message_link_pattern = r"https://discord\.com/channels/(\d+)/(\d+)/(\d+)"
-        matches = re.findall(message_link_pattern, message.content)
+    async def cog_load(self):
+        # リンクを含むメッセージだけ正規表現で調べる (Botのメッセージは無視する)
+        message_pipeline.register(
+            "message_link", self.handle_message, keywords=("discord.com/channels/",)
+        )
+
+    async def cog_unload(self):
+        message_pipeline.unregister("message_link")
+
+    async def handle_message(self, message: discord.Message):
+        matches = MESSAGE_LINK_PATTERN.findall(message.content)
 
         # メッセージリンクが見つかった場合
         for match in matches:
@@ -5,9 +5,11 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import re
-import requests
 import os
 from dotenv import load_dotenv
+from core.lazy import lazy_import
+
+requests = lazy_import("requests")
 
 load_dotenv()
 
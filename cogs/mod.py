@@ -7,6 +7,8 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
+from core.intents import get_or_fetch_member
+
 
 class Mod(commands.Cog):
     def __init__(self, bot):
@@ -57,7 +59,7 @@ class Mod(commands.Cog):
         reason: str = None,
     ):
         try:
-            guild_member = interaction.guild.get_member(member.id)
+            guild_member = await get_or_fetch_member(interaction.guild, member.id)
             if guild_member:
                 await guild_member.kick(reason=reason)
                 await interaction.response.send_message(
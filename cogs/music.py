@@ -2,15 +2,29 @@
 # Author: Miriel (@mirielnet)
 
 import asyncio
+import collections
+import itertools
+import os
+import random
 import re
 import time
-import traceback
 
 import discord
-import yt_dlp as youtube_dl
 from discord import app_commands
 from discord.ext import commands
+from core.router import component_router
+from core.ytdl import ytdl_pool, stream_expiry, ExtractionBusy
+from logging import getLogger
 
+logger = getLogger(__name__)
+
+# VCの接続状態 (interaction.user.voice) を使う。core.intentsが参照する
+INTENTS = ("voice_states",)
+
+# 音量 (1.0で原音のまま)。FFmpegのフィルターで適用する
+VOLUME = float(os.getenv("MUSIC_VOLUME", "0.5"))
+# FFmpegでOpusにエンコードするときのビットレート (kbps)
+BITRATE = int(os.getenv("MUSIC_BITRATE", "128"))
 
 FFMPEG_OPTIONS = {
     "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
@@ -18,9 +32,101 @@ FFMPEG_OPTIONS = {
 }
 
 
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
+# 再生キューに表示する曲数
+QUEUE_DISPLAY_LIMIT = 20
+# 1つのサーバーの再生キューに入れられる曲数
+MAX_QUEUE = int(os.getenv("MUSIC_MAX_QUEUE", "500"))
+# 抽出が混み合っている・タイムアウトしたときに再試行する回数と、最初の待ち時間 (秒)
+RESOLVE_RETRIES = 3
+RESOLVE_RETRY_DELAY = 2.0
+
+
+class Track:
+    """再生キューの1曲分の情報です。
+
+    プレイリストの曲はタイトルとURLだけを持ち、ストリームURLの取得とFFmpegの起動は
+    その曲を再生する直前 (次の曲は先読み) に行います。
+    """
+
+    __slots__ = ("url", "title", "duration", "requester", "data", "task", "attempts")
+
+    def __init__(self, url, title, duration, requester, data=None):
+        self.url = url
+        self.title = title
+        self.duration = duration
+        self.requester = requester
+        self.data = data
+        self.task = None
+        self.attempts = 0
+
+    @classmethod
+    async def from_url(cls, url, requester, *, guild_id=None):
+        logger.debug(f"Fetching URL: {url}")
+        data = await ytdl_pool.extract(url, guild_id=guild_id, profile="stream")
+
+        if "entries" in data:
+            return [
+                cls(
+                    entry.get("webpage_url") or entry["url"],
+                    entry.get("title"),
+                    entry.get("duration"),
+                    requester,
+                )
+                for entry in data["entries"]
+                if entry
+            ]
+
+        return [cls(data.get("webpage_url") or url, data.get("title"), data.get("duration"), requester, data)]
+
+    def prefetch(self, guild_id):
+        """ストリームURLの取得をバックグラウンドで始めます。"""
+        if self.data is not None:
+            expiry = stream_expiry(self.data)
+            if expiry is None or expiry > time.time() + 60:
+                return
+            # キューで待っている間にストリームURLの期限が近づいた
+            self.data = None
+        if self.task is None:
+            self.task = asyncio.create_task(ytdl_pool.extract(self.url, guild_id=guild_id))
+            self.task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    def cancel(self):
+        """先読みを取り消します。キューから外れた曲が抽出の枠を使い続けないようにします。"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def resolve(self, guild_id):
+        self.prefetch(guild_id)
+        if self.task is not None:
+            try:
+                self.data = await self.task
+            finally:
+                self.task = None
+        return self.data
+
+
+class YTDLSource(discord.FFmpegOpusAudio):
+    """FFmpegが出力したOpusのパケットをそのまま送信する音声ソースです。
+
+    音量の調整とエンコードはFFmpegで行い、ボットのプロセスではPCMを扱いません。
+    元の音声がOpusで音量も変えない (MUSIC_VOLUME=1.0) 場合は、再エンコードせずにコピーします。
+    既定の0.5では音量フィルターのためFFmpegでのエンコードが必要なので、コピーは行われません。
+    """
+
+    def __init__(self, data, *, volume=VOLUME):
+        passthrough = data.get("acodec") == "opus" and volume == 1.0
+        options = FFMPEG_OPTIONS["options"]
+        if not passthrough:
+            options += f" -af volume={volume}"
+        super().__init__(
+            data["url"],
+            bitrate=BITRATE,
+            # "opus" を渡すとdiscord.pyは再エンコードせずにコピーする ("copy" は新しい版でしか受け付けない)
+            codec="opus" if passthrough else None,
+            before_options=FFMPEG_OPTIONS["before_options"],
+            options=options,
+        )
         self.data = data
         self.title = data.get("title")
         self.url = data.get("url")
@@ -31,39 +137,9 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.pause_start_time = 0
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False):
-        print(f"Fetching URL: {url}")
-        loop = loop or asyncio.get_event_loop()
-        ytdl = youtube_dl.YoutubeDL(
-            {
-                "format": "bestaudio/best",
-                "outtmpl": "%(extractor)s-%(id)s-%(title)s.%(ext)s",
-                "restrictfilenames": True,
-                "noplaylist": False,  # Allow playlists
-                "nocheckcertificate": True,
-                "ignoreerrors": False,
-                "logtostderr": False,
-                "quiet": True,
-                "no_warnings": True,
-                "default_search": "auto",
-                "source_address": "0.0.0.0",
-                "cookiefile": "./yt-cookie.txt",
-            }
-        )
-        data = await loop.run_in_executor(
-            None, lambda: ytdl.extract_info(url, download=False)
-        )
-
-        if "entries" in data:
-            entries = data["entries"]
-            return [
-                cls(discord.FFmpegPCMAudio(entry["url"], **FFMPEG_OPTIONS), data=entry)
-                for entry in entries
-            ]
-
-        filename = data["url"] if stream else ytdl.prepare_filename(data)
-        print(f"Filename: {filename}")
-        return [cls(discord.FFmpegPCMAudio(filename, **FFMPEG_OPTIONS), data=data)]
+    async def from_track(cls, track, *, guild_id=None):
+        data = await track.resolve(guild_id)
+        return cls(data)
 
     def get_current_time(self):
         if self.paused:
@@ -85,6 +161,258 @@ class YTDLSource(discord.PCMVolumeTransformer):
             self.seek_time += time.time() - self.pause_start_time
 
 
+class GuildPlayer:
+    """サーバーごとの再生キューと、それを順に再生するタスクです。
+
+    曲が終わるとボイスのスレッドからイベントをセットするだけで、次の曲の準備と再生は
+    このサーバー専用のタスクが行います。キューの長さはMAX_QUEUEまでです。
+
+    キューはdequeなので先頭・末尾の追加と取り出し (再生・スキップ・追加) はO(1)ですが、
+    番号を指定したremove/moveは端からの距離に比例します。その分はMAX_QUEUEで上限を設けています。
+    """
+
+    __slots__ = (
+        "cog", "guild", "channel", "queue", "current", "requester",
+        "message", "finished", "wakeup", "task", "progress_task", "retrying",
+    )
+
+    def __init__(self, cog, guild, channel):
+        self.cog = cog
+        self.guild = guild
+        # 再生中の表示を送るチャンネル (最後に/playを使ったチャンネル)
+        self.channel = channel
+        self.queue = collections.deque()
+        self.current = None
+        self.requester = None
+        self.message = None
+        self.finished = asyncio.Event()
+        self.wakeup = asyncio.Event()
+        self.progress_task = None
+        # 抽出の再試行を待っている曲 (キューの先頭に戻してある)
+        self.retrying = None
+        self.task = asyncio.create_task(self._run(), name=f"music:{guild.id}")
+
+    def add(self, tracks):
+        """キューに追加し、上限を超えて追加できなかった曲数を返します。"""
+        accepted = tracks[:max(MAX_QUEUE - len(self.queue), 0)]
+        self.queue.extend(accepted)
+        if accepted:
+            self.wakeup.set()
+        return len(tracks) - len(accepted)
+
+    def skip(self):
+        track = self.retrying
+        if track is not None:
+            # 再試行の待ち時間中なら、その曲を外して待ちを打ち切る
+            self.retrying = None
+            if self.queue and self.queue[0] is track:
+                self.queue.popleft()
+            track.cancel()
+            self.finished.set()
+            return True
+        voice_client = self.guild.voice_client
+        if voice_client is None or not (voice_client.is_playing() or voice_client.is_paused()):
+            return False
+        # afterが呼ばれ、再生ループが次の曲に進む
+        voice_client.stop()
+        return True
+
+    def clear(self):
+        for track in self.queue:
+            track.cancel()
+        self.queue.clear()
+
+    def stop(self):
+        self.clear()
+        return self.skip()
+
+    def remove(self, index):
+        # dequeの途中の削除・挿入はO(1)ではない (端からの距離に比例) が、MAX_QUEUEまでに収まる
+        track = self.queue[index]
+        del self.queue[index]
+        track.cancel()
+        return track
+
+    def move(self, index, destination):
+        track = self.queue[index]
+        del self.queue[index]
+        self.queue.insert(destination, track)
+        return track
+
+    def shuffle(self):
+        tracks = list(self.queue)
+        random.shuffle(tracks)
+        self.queue = collections.deque(tracks)
+        # 次の曲でなくなった曲の先読みは取り消し、新しい先頭を先読みする
+        for track in tracks[1:]:
+            track.cancel()
+        if tracks and self.current is not None:
+            tracks[0].prefetch(self.guild.id)
+
+    def _after(self, error):
+        # ボイスのスレッドで呼ばれる。ループに知らせるだけで待たない
+        if error:
+            logger.error(f"Error in after_playing: {error}")
+        self.cog.bot.loop.call_soon_threadsafe(self.finished.set)
+
+    async def _run(self):
+        guild_id = self.guild.id
+        try:
+            while True:
+                if not self.queue:
+                    self.current = None
+                    logger.debug(f"Queue is empty in guild {guild_id}, waiting for next command")
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+
+                track = self.queue.popleft()
+                try:
+                    source = await YTDLSource.from_track(track, guild_id=guild_id)
+                except (ExtractionBusy, asyncio.TimeoutError) as e:
+                    # 一時的な失敗。先頭に戻し、待ち時間を延ばしながら再試行する
+                    if track.attempts < RESOLVE_RETRIES:
+                        delay = RESOLVE_RETRY_DELAY * 2 ** track.attempts
+                        track.attempts += 1
+                        logger.warning(f"Retrying {track.url} in {delay}s: {type(e).__name__}")
+                        self.queue.appendleft(track)
+                        # skipで打ち切れるよう、finishedを待つ
+                        self.retrying = track
+                        self.finished.clear()
+                        try:
+                            await asyncio.wait_for(self.finished.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+                        self.retrying = None
+                        continue
+                    logger.error(f"Giving up on {track.url} after {track.attempts} retries: {type(e).__name__}")
+                    reason = "混み合っている" if isinstance(e, ExtractionBusy) else "タイムアウトした"
+                    await self.notify(f"{track.title} の読み込みが{reason}ため、スキップしました。")
+                    continue
+                except Exception as e:
+                    logger.error(f"Error resolving {track.url}: {e}")
+                    await self.notify(f"{track.title} を読み込めなかったため、スキップしました。")
+                    continue
+                voice_client = self.guild.voice_client
+                if voice_client is None:
+                    source.cleanup()
+                    break
+                if self.queue:
+                    # 次の曲のストリームURLを先に取得しておく
+                    self.queue[0].prefetch(guild_id)
+
+                self.current, self.requester = source, track.requester
+                source.set_current_time(0)  # Reset the progress to 0 for new song
+                logger.info(f"Now playing in guild {guild_id}: {source.title}")
+                self.finished.clear()
+                try:
+                    voice_client.play(source, after=self._after)
+                except Exception as e:
+                    logger.error(f"Error playing audio: {e}")
+                    source.cleanup()
+                    continue
+                await self.send_now_playing()
+                await self.finished.wait()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception(f"Player for guild {guild_id} stopped unexpectedly")
+        finally:
+            self._teardown()
+
+    def _teardown(self):
+        if self.progress_task is not None:
+            self.progress_task.cancel()
+            self.progress_task = None
+        self.clear()
+        self.current = self.requester = self.message = None
+        if self.cog.players.get(self.guild.id) is self:
+            del self.cog.players[self.guild.id]
+
+    async def destroy(self):
+        """再生ループを止め、キューを破棄してVCから切断します。"""
+        self.task.cancel()
+        voice_client = self.guild.voice_client
+        if voice_client is not None:
+            await voice_client.disconnect()
+
+    async def notify(self, content):
+        try:
+            await self.channel.send(content)
+        except discord.HTTPException as e:
+            logger.error(f"Failed to send message to music channel: {e}")
+
+    def now_playing_embed(self):
+        embed = discord.Embed(title="再生中")
+        embed.add_field(
+            name=self.current.title,
+            value=f"{self.requester.mention}",
+            inline=False,
+        )
+        embed.add_field(
+            name="再生時間",
+            value=format_progress_bar(self.current.get_current_time(), self.current.duration),
+            inline=False,
+        )
+        return embed
+
+    def queue_embed(self):
+        embed = discord.Embed(title="再生キュー")
+        if self.current:
+            embed.add_field(
+                name="再生中",
+                value=f"{self.current.title} / {self.requester.mention}",
+                inline=False,
+            )
+        if self.queue:
+            for i, track in enumerate(itertools.islice(self.queue, QUEUE_DISPLAY_LIMIT)):
+                embed.add_field(
+                    name=f"#{i + 1}",
+                    value=f"{track.title} / {track.requester.mention}",
+                    inline=False,
+                )
+            if len(self.queue) > QUEUE_DISPLAY_LIMIT:
+                embed.set_footer(text=f"他 {len(self.queue) - QUEUE_DISPLAY_LIMIT} 曲")
+        else:
+            embed.description = "再生キューは空です。"
+        return embed
+
+    async def send_now_playing(self):
+        try:
+            self.message = await self.channel.send(embed=self.now_playing_embed(), view=ControlView(self.cog))
+        except discord.HTTPException as e:
+            logger.error(f"Failed to send now playing message: {e}")
+            return
+        if self.progress_task is not None:
+            self.progress_task.cancel()
+        self.progress_task = asyncio.create_task(self._update_progress_bar(self.current))
+
+    async def _update_progress_bar(self, source):
+        voice_client = self.guild.voice_client
+        while self.current is source and voice_client is not None and voice_client.is_connected():
+            await asyncio.sleep(1)
+            if self.current is not source or source.paused:
+                continue
+            try:
+                await self.message.edit(embed=self.now_playing_embed())
+            except discord.HTTPException:
+                return
+
+
+def format_progress_bar(current, total, length=20):
+    if not total:
+        # ライブ配信など長さが分からない場合
+        return format_time(current)
+    filled_length = min(int(length * current // total), length)
+    bar = "─" * filled_length + "●" + "─" * (length - filled_length)
+    return f"{format_time(current)} {bar} {format_time(total)}"
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02}:{int(seconds):02}"
+
+
 class ControlView(discord.ui.View):
     def __init__(self, cog):
         self.cog = cog
@@ -95,34 +423,33 @@ class ControlView(discord.ui.View):
         self, interaction: discord.Interaction, button: discord.ui.Button
     ) -> None:
         voice_client = interaction.guild.voice_client
-        guild_id = interaction.guild.id
+        player = self.cog.players.get(interaction.guild.id)
+        if voice_client is None or player is None or player.current is None:
+            await interaction.response.send_message("再生中の曲がありません。", ephemeral=True)
+            return
         if voice_client.is_playing():
-            self.cog.current[interaction.guild.id].pause()
+            player.current.pause()
             voice_client.pause()
             await interaction.response.send_message(
                 "音楽を一時停止しました。", ephemeral=True
             )
         else:
             voice_client.resume()
-            self.cog.current[guild_id].resume()
+            player.current.resume()
             await interaction.response.send_message(
                 "音楽を再生しました。", ephemeral=True
             )
-            if guild_id in self.cog.progress_tasks:
-                self.cog.progress_tasks[guild_id].cancel()
-            self.cog.progress_tasks[guild_id] = interaction.client.loop.create_task(
-                self.cog.update_progress_bar(interaction.guild)
-            )
 
     @discord.ui.button(label="⏹️ 停止", style=discord.ButtonStyle.danger)
     async def stop(
         self, interaction: discord.Interaction, button: discord.ui.Button
     ) -> None:
-        voice_client = interaction.guild.voice_client
-        voice_client.stop()
-        self.cog.queues[interaction.guild.id] = []  # キューをクリア
-        self.cog.current[interaction.guild.id] = None
-        await self.cog.update_queue_message(interaction)
+        player = self.cog.players.get(interaction.guild.id)
+        if player is None:
+            await interaction.response.send_message("再生中の曲がありません。", ephemeral=True)
+            return
+        player.stop()  # キューをクリア
+        await interaction.response.send_message(embed=player.queue_embed())
 
     @discord.ui.button(label="🔊 切断", style=discord.ButtonStyle.danger)
     async def disconnect(
@@ -131,129 +458,47 @@ class ControlView(discord.ui.View):
         await interaction.response.send_message(
             "ボイスチャンネルから切断します。", ephemeral=True
         )
-        await interaction.guild.voice_client.disconnect()
+        await self.cog.disconnect_guild(interaction.guild)
 
 
 class Music(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.queues = {}  # Manage queues per guild
-        self.current = {}  # Manage current song per guild
-        self.requesters = {}  # Manage requesters per guild
-        self.current_messages = {}  # Manage messages per guild
-        self.progress_tasks = {}  # Manage progress tasks per guild
-
-    async def play_next(self, interaction):
-        guild_id = interaction.guild.id
-        print(f"Playing next in queue for guild: {guild_id}")
-        if self.queues[guild_id]:
-            self.current[guild_id], self.requesters[guild_id] = self.queues[
-                guild_id
-            ].pop(0)
-            self.current[guild_id].set_current_time(
-                0
-            )  # Reset the progress to 0 for new song
-            print(f"Now playing: {self.current[guild_id].title}")
-
-            def after_playing(error):
-                if error:
-                    print(f"Error in after_playing: {error}")
-                coro = self.play_next(interaction)
-                fut = asyncio.run_coroutine_threadsafe(coro, self.bot.loop)
-                try:
-                    fut.result()
-                except Exception as e:
-                    print(f"Error in after_playing coroutine: {e}")
-
-            try:
-                interaction.guild.voice_client.play(
-                    self.current[guild_id], after=after_playing
-                )
-                await self.update_now_playing(interaction)
-            except Exception as e:
-                print(f"Error playing audio: {e}")
-                await self.play_next(interaction)
-        else:
-            self.current[guild_id] = None
-            await self.update_queue_message(interaction)
-            print("Queue is empty, waiting for next command")
-
-    async def update_now_playing(self, interaction):
-        guild_id = interaction.guild.id
-        if self.current[guild_id]:
-            embed = discord.Embed(title="再生中")
-            embed.add_field(
-                name=self.current[guild_id].title,
-                value=f"{self.requesters[guild_id].mention}",
-                inline=False,
-            )
-            embed.add_field(
-                name="再生時間",
-                value=self.format_progress_bar(0, self.current[guild_id].duration),
-                inline=False,
-            )
-            view = ControlView(self)
-            message = await interaction.followup.send(embed=embed, view=view)
-            self.current_messages[guild_id] = message
-            if guild_id in self.progress_tasks:
-                self.progress_tasks[guild_id].cancel()
-            self.progress_tasks[guild_id] = self.bot.loop.create_task(
-                self.update_progress_bar(interaction.guild)
-            )
-
-    async def update_progress_bar(self, guild: discord.Guild):
-        while (
-            guild.voice_client
-            and (guild.voice_client.is_playing() or guild.voice_client.is_paused())
-            and self.current_messages[guild.id]
-        ):
-            await asyncio.sleep(1)
-            if self.current[guild.id]:
-                current_time = self.current[guild.id].get_current_time()
-                embed = discord.Embed(title="再生中")
-                embed.add_field(
-                    name=self.current[guild.id].title,
-                    value=f"{self.requesters[guild.id].mention}",
-                    inline=False,
-                )
-                embed.add_field(
-                    name="再生時間",
-                    value=self.format_progress_bar(
-                        current_time, self.current[guild.id].duration
-                    ),
-                    inline=False,
-                )
-                view = ControlView(self)
-                await self.current_messages[guild.id].edit(embed=embed, view=view)
-
-    async def update_queue_message(self, interaction):
-        guild_id = interaction.guild.id
-        embed = discord.Embed(title="再生キュー")
-        if self.current[guild_id]:
-            embed.add_field(
-                name="再生中",
-                value=f"{self.current[guild_id].title} / {self.requesters[guild_id].mention}",
-                inline=False,
+        self.players = {}  # サーバーID -> GuildPlayer
+
+    async def cog_load(self):
+        # 検索結果のSelectメニュー
+        component_router.register("video-select", self.on_video_select)
+
+    async def cog_unload(self):
+        component_router.unregister("video-select")
+        for player in list(self.players.values()):
+            await player.destroy()
+
+    def get_player(self, interaction):
+        player = self.players.get(interaction.guild.id)
+        if player is None:
+            player = self.players[interaction.guild.id] = GuildPlayer(
+                self, interaction.guild, interaction.channel
             )
-        if self.queues[guild_id]:
-            for i, (player, requester) in enumerate(self.queues[guild_id]):
-                embed.add_field(
-                    name=f"#{i + 1}",
-                    value=f"{player.title} / {requester.mention}",
-                    inline=False,
-                )
         else:
-            embed.description = "再生キューは空です。"
-        await interaction.followup.send(embed=embed)
+            player.channel = interaction.channel
+        return player
 
-    def format_progress_bar(self, current, total, length=20):
-        filled_length = int(length * current // total)
-        bar = "─" * filled_length + "●" + "─" * (length - filled_length)
-        return f"{self.format_time(current)} {bar} {self.format_time(total)}"
+    async def disconnect_guild(self, guild):
+        player = self.players.get(guild.id)
+        if player is not None:
+            await player.destroy()
+        elif guild.voice_client is not None:
+            await guild.voice_client.disconnect()
 
-    def format_time(self, seconds):
-        minutes, seconds = divmod(seconds, 60)
-        return f"{int(minutes):02}:{int(seconds):02}"
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        # キックなどでボットがVCから外れたら、そのサーバーの再生状態を破棄する
+        if member.id == self.bot.user.id and before.channel is not None and after.channel is None:
+            player = self.players.get(member.guild.id)
+            if player is not None:
+                player.task.cancel()
 
     @app_commands.command(
         name="play", description="YouTubeまたはSoundCloudの音楽を再生します。"
@@ -263,7 +508,7 @@ class Music(commands.Cog):
     ):
         #ログに記録を残す
         guild_id = interaction.guild.id
-        print(f"Received play command for guild: {guild_id}")
+        logger.debug(f"Received play command for guild: {guild_id}")
         
         #url引数がurlであるか確認
         #urlの正規表現を定義
@@ -281,22 +526,17 @@ class Music(commands.Cog):
         else:
             await interaction.response.defer()
             #urlでないときは検索してSelectを送信
-            with youtube_dl.YoutubeDL(
-                {
-                    "format": 'bestaudio',
-                    "noplaylist": True,
-                    "nocheckcertificate": True,
-                    "ignoreerrors": False,
-                    "logtostderr": False,
-                    "quiet": True,
-                    "no_warnings": True,
-                    "cookiefile": "./yt-cookie.txt",
-                }
-            ) as ytdl:
-                #検索結果を5件取得
-                videos = ytdl.extract_info(
-                    f"ytsearch5:{url}", download=False
+            try:
+                #検索結果を5件取得 (ワーカースレッドで実行し、イベントループは止めない)
+                videos = (
+                    await ytdl_pool.extract(f"ytsearch5:{url}", guild_id=guild_id, profile="search")
                 )['entries']
+            except ExtractionBusy:
+                await interaction.followup.send("現在検索が混み合っています。しばらくしてからもう一度お試しください。")
+                return
+            except asyncio.TimeoutError:
+                await interaction.followup.send("検索がタイムアウトしました。")
+                return
             #配列から必要な情報を抽出
             entries = [(entry['title'], f"https://www.youtube.com/watch?v={entry['id']}") for entry in videos]
             select = discord.ui.Select(
@@ -328,31 +568,32 @@ class Music(commands.Cog):
             await channel.connect()
 
         try:
-            players = await YTDLSource.from_url(url, loop=self.bot.loop, stream=True)
+            tracks = await Track.from_url(url, interaction.user, guild_id=guild_id)
+        except ExtractionBusy:
+            await interaction.followup.send("現在読み込みが混み合っています。しばらくしてからもう一度お試しください。")
+            return
+        except asyncio.TimeoutError:
+            await interaction.followup.send("読み込みがタイムアウトしました。")
+            return
         except Exception as e:
-            print(f"Error fetching URL: {e}")
-            traceback.print_exc()
+            logger.exception(f"Error fetching URL: {e}")
             await interaction.followup.send("無効なURLです。")
             return
 
-        for player in players:
-            if guild_id not in self.queues:
-                self.queues[guild_id] = []
-            self.queues[guild_id].append((player, interaction.user))
-            if not self.current.get(guild_id):
-                await self.play_next(interaction)
-
-        await self.update_queue_message(interaction)
+        player = self.get_player(interaction)
+        dropped = player.add(tracks)
+        await interaction.followup.send(embed=player.queue_embed())
+        if dropped:
+            await interaction.followup.send(
+                f"再生キューが上限 ({MAX_QUEUE}曲) に達したため、{dropped}曲は追加されませんでした。"
+            )
 
     @app_commands.command(name="skip", description="再生中の曲をスキップします。")
     async def skip(self, interaction: discord.Interaction):
         guild_id = interaction.guild.id
-        print(f"Received skip command for guild: {guild_id}")
-        if (
-            guild.voice_client is not None
-            and interaction.guild.voice_client.is_playing()
-        ):
-            interaction.guild.voice_client.stop()
+        logger.debug(f"Received skip command for guild: {guild_id}")
+        player = self.players.get(guild_id)
+        if player is not None and player.skip():
             await interaction.response.send_message("スキップしました。")
         else:
             await interaction.response.send_message("スキップする曲がありません。")
@@ -362,13 +603,9 @@ class Music(commands.Cog):
     )
     async def stop(self, interaction: discord.Interaction):
         guild_id = interaction.guild.id
-        print(f"Received stop command for guild: {guild_id}")
-        if (
-            interaction.guild.voice_client is not None
-            and interaction.guild.voice_client.is_playing()
-        ):
-            interaction.guild.voice_client.stop()
-            self.queues[guild_id] = []
+        logger.debug(f"Received stop command for guild: {guild_id}")
+        player = self.players.get(guild_id)
+        if player is not None and player.stop():
             await interaction.response.send_message(
                 "再生を停止し、再生キューをクリアしました。"
             )
@@ -377,20 +614,56 @@ class Music(commands.Cog):
 
     @app_commands.command(name="queue", description="再生キューを表示します。")
     async def queue(self, interaction: discord.Interaction):
-        print(f"Received queue command for guild: {interaction.guild.id}")
-        await interaction.response.defer()
-        await self.update_queue_message(interaction)
+        logger.debug(f"Received queue command for guild: {interaction.guild.id}")
+        player = self.players.get(interaction.guild.id)
+        if player is None:
+            await interaction.response.send_message("再生キューは空です。")
+            return
+        await interaction.response.send_message(embed=player.queue_embed())
+
+    @app_commands.command(name="remove", description="再生キューから曲を削除します。")
+    @app_commands.describe(position="削除する曲の番号")
+    async def remove(self, interaction: discord.Interaction, position: int):
+        player = self.players.get(interaction.guild.id)
+        if player is None or not 1 <= position <= len(player.queue):
+            await interaction.response.send_message("指定された番号の曲がありません。")
+            return
+        track = player.remove(position - 1)
+        await interaction.response.send_message(f"#{position} {track.title} を削除しました。")
+
+    @app_commands.command(name="move", description="再生キューの曲の順番を変更します。")
+    @app_commands.describe(position="移動する曲の番号", destination="移動先の番号")
+    async def move(self, interaction: discord.Interaction, position: int, destination: int):
+        player = self.players.get(interaction.guild.id)
+        if player is None or not 1 <= position <= len(player.queue):
+            await interaction.response.send_message("指定された番号の曲がありません。")
+            return
+        destination = min(max(destination, 1), len(player.queue))
+        track = player.move(position - 1, destination - 1)
+        await interaction.response.send_message(f"{track.title} を #{destination} に移動しました。")
+
+    @app_commands.command(name="shuffle", description="再生キューをシャッフルします。")
+    async def shuffle(self, interaction: discord.Interaction):
+        player = self.players.get(interaction.guild.id)
+        if player is None or not player.queue:
+            await interaction.response.send_message("再生キューは空です。")
+            return
+        player.shuffle()
+        await interaction.response.send_message(embed=player.queue_embed())
 
     @app_commands.command(name="pause", description="再生を一時停止します。")
     async def pause(self, interaction: discord.Interaction):
         guild_id = interaction.guild.id
-        print(f"Received pause command for guild: {guild_id}")
+        logger.debug(f"Received pause command for guild: {guild_id}")
+        player = self.players.get(guild_id)
         if (
             interaction.guild.voice_client is not None
             and interaction.guild.voice_client.is_playing()
+            and player is not None
+            and player.current is not None
         ):
             interaction.guild.voice_client.pause()
-            self.current[guild_id].pause()
+            player.current.pause()
             await interaction.response.send_message("再生を一時停止しました。")
         else:
             await interaction.response.send_message("一時停止する曲がありません。")
@@ -398,13 +671,16 @@ class Music(commands.Cog):
     @app_commands.command(name="resume", description="一時停止した再生を再開します。")
     async def resume(self, interaction: discord.Interaction):
         guild_id = interaction.guild.id
-        print(f"Received resume command for guild: {guild_id}")
+        logger.debug(f"Received resume command for guild: {guild_id}")
+        player = self.players.get(guild_id)
         if (
             interaction.guild.voice_client is not None
             and interaction.guild.voice_client.is_paused()
+            and player is not None
+            and player.current is not None
         ):
             interaction.guild.voice_client.resume()
-            self.current[guild_id].resume()
+            player.current.resume()
             await interaction.response.send_message("再生を再開しました。")
         else:
             await interaction.response.send_message("再開する曲がありません。")
@@ -414,11 +690,9 @@ class Music(commands.Cog):
     )
     async def disconnect(self, interaction: discord.Interaction):
         guild_id = interaction.guild.id
-        print(f"Received disconnect command for guild: {guild_id}")
+        logger.debug(f"Received disconnect command for guild: {guild_id}")
         if interaction.guild.voice_client is not None:
-            await interaction.guild.voice_client.disconnect()
-            self.queues[guild_id] = []
-            self.current[guild_id] = None
+            await self.disconnect_guild(interaction.guild)
             await interaction.response.send_message(
                 "ボイスチャンネルから切断しました。"
             )
@@ -429,25 +703,19 @@ class Music(commands.Cog):
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
-        print(f"Error in command {ctx.command}: {error}")
+        logger.error(f"Error in command {ctx.command}: {error}")
 
-    @commands.Cog.listener()
-    async def on_interaction(self, interaction: discord.Interaction):
-        
-        interaction.data.setdefault("custom_id", None)
-
-        #検索のSelectの時
-        if interaction.data["custom_id"] == "video-select":
-            #選択された動画のurlを取得
-            selected_url = interaction.data["values"][0]
-            if not interaction.user.voice:
-                await interaction.response.send_message(
-                    "音楽を再生するためにボイスチャンネルに接続してください。"
-                )
-                return
-            
-            #urlが取得できた時は再生を行う
-            await self._play(interaction, selected_url, interaction.user.voice.channel)
+    async def on_video_select(self, interaction: discord.Interaction):
+        #選択された動画のurlを取得
+        selected_url = interaction.data["values"][0]
+        if not interaction.user.voice:
+            await interaction.response.send_message(
+                "音楽を再生するためにボイスチャンネルに接続してください。"
+            )
+            return
+
+        #urlが取得できた時は再生を行う
+        await self._play(interaction, selected_url, interaction.user.voice.channel)
 
 
 
@@ -6,6 +6,9 @@ import json
 from discord import app_commands
 from discord.ext import commands
 from core.connect import db  # 非同期データベース接続を想定
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 class RoleButtonView(discord.ui.View):
     def __init__(self, role_map):
@@ -35,22 +38,9 @@ class RolePanel(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.role_panels = {}  # ロールパネル情報を保持する辞書
-        bot.loop.create_task(self.initialize_database())
         bot.loop.create_task(self.load_role_panels())  # 起動時にロールパネル情報をロードする
         bot.loop.create_task(self.register_existing_role_panels())  # 再起動時に既存のロールパネルを再登録する
 
-    async def initialize_database(self):
-        # role_panels テーブルの作成クエリ
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS role_panels (
-            message_id BIGINT PRIMARY KEY,
-            guild_id BIGINT NOT NULL,
-            channel_id BIGINT NOT NULL,
-            role_map JSONB NOT NULL
-        );
-        """
-        await db.execute_query(create_table_query)
-
     async def load_role_panels(self):
         # データベースからロールパネル情報をロード
         select_query = "SELECT message_id, role_map FROM role_panels"
@@ -74,7 +64,7 @@ class RolePanel(commands.Cog):
             # チャンネルの取得
             channel = self.bot.get_channel(channel_id)
             if channel is None:
-                print(f"チャンネルID {channel_id} が見つかりません。メッセージID {message_id} をスキップします。")
+                logger.warning(f"チャンネルID {channel_id} が見つかりません。メッセージID {message_id} をスキップします。")
                 continue
 
             try:
@@ -82,17 +72,17 @@ class RolePanel(commands.Cog):
                 message = await channel.fetch_message(message_id)
                 view = RoleButtonView(role_map=role_map)
                 await message.edit(view=view)
-                print(f"メッセージID {message_id} のビューを正常に再設定しました。")
+                logger.debug(f"メッセージID {message_id} のビューを正常に再設定しました。")
 
             except discord.NotFound:
-                print(f"メッセージID {message_id} が見つかりません。データベースから削除します。")
+                logger.info(f"メッセージID {message_id} が見つかりません。データベースから削除します。")
                 await db.execute_query("DELETE FROM role_panels WHERE message_id = $1", (message_id,))
 
             except discord.Forbidden:
-                print(f"メッセージID {message_id} の権限が不足しています。")
+                logger.warning(f"メッセージID {message_id} の権限が不足しています。")
 
             except discord.HTTPException as e:
-                print(f"メッセージID {message_id} の再登録に失敗しました: {e}")
+                logger.error(f"メッセージID {message_id} の再登録に失敗しました: {e}")
 
     @app_commands.command(
         name="panel", description="指定されたロールパネルを作成します。"
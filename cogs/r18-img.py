@@ -5,6 +5,9 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import httpx  # Import httpx for HTTP requests
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 class R18IMG(commands.Cog):
     def __init__(self, bot):
@@ -47,7 +50,7 @@ class R18IMG(commands.Cog):
                     await interaction.response.send_message("画像の取得中にエラーが発生しました。", ephemeral=True)
 
         except Exception as e:
-            print(e)
+            logger.error(f"Failed to fetch image: {e}")
             await interaction.response.send_message("画像の取得中にエラーが発生しました。", ephemeral=True)
 
 async def setup(bot: commands.Bot):
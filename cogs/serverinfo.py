@@ -4,6 +4,10 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from core.intents import ensure_chunked
+
+# ボット数の集計でメンバー一覧を使う。core.intentsが参照する
+INTENTS = ("members",)
 
 class ServerInfo(commands.Cog):
     def __init__(self, bot):
@@ -25,7 +29,11 @@ class ServerInfo(commands.Cog):
         guild_id = guild.id or "不明"
         guild_created_at = guild.created_at.strftime('%Y/%m/%d %H:%M:%S') if guild.created_at else "不明"
         member_count = guild.member_count or "不明"
-        bot_count = len([member for member in guild.members if member.bot])
+        # メンバーは起動時に取得していないので、必要になったときに取得する
+        if await ensure_chunked(guild):
+            bot_count = len([member for member in guild.members if member.bot])
+        else:
+            bot_count = "不明"
         
         text_channels = len([channel for channel in guild.channels if isinstance(channel, discord.TextChannel)])
         voice_channels = len([channel for channel in guild.channels if isinstance(channel, discord.VoiceChannel)])
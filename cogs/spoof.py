@@ -4,10 +4,13 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from logging import getLogger
 
 # A global variable to store the webhook
 webhook = None
 
+logger = getLogger(__name__)
+
 class Spoof(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -37,7 +40,7 @@ class Spoof(commands.Cog):
             await interaction.followup.send(f"{user.name} のなりすましWebHookを作成し、指定した言葉を送信しました。", ephemeral=True)
         
         except Exception as error:
-            print(f"Error creating or sending webhook message: {error}")
+            logger.error(f"Error creating or sending webhook message: {error}")
             await interaction.followup.send("WebHookの作成やメッセージの送信中にエラーが発生しました。", ephemeral=True)
 
 async def setup(bot: commands.Bot):
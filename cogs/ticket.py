@@ -4,11 +4,21 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from core.router import component_router
 
 class TicketManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        # カテゴリー名はcustom_idの "create_ticket:" 以降
+        component_router.register("create_ticket:", self.create_ticket)
+        component_router.register("close_ticket", self.close_ticket)
+
+    async def cog_unload(self):
+        component_router.unregister("create_ticket:")
+        component_router.unregister("close_ticket")
+
     @app_commands.command(name="ticket", description="Ticketシステムの設定")
     @app_commands.describe(category="チケットを作成するカテゴリー名を指定", custom_message="カスタムメッセージを設定する")
     async def ticket(self, interaction: discord.Interaction, category: str, custom_message: str = None):
@@ -31,16 +41,6 @@ class TicketManager(commands.Cog):
         await interaction.response.send_message(embed=embed, view=view)
         self.bot.add_view(view)  # ボタンビューを再登録
 
-    @commands.Cog.listener()
-    async def on_interaction(self, interaction: discord.Interaction):
-        # custom_idからアクションとカテゴリーを取得
-        custom_id = interaction.data.get("custom_id")
-        if custom_id and custom_id.startswith("create_ticket:"):
-            category = custom_id.split(":", 1)[1]  # カテゴリー名を取得
-            await self.create_ticket(interaction, category)
-        elif custom_id == "close_ticket":
-            await self.close_ticket(interaction)
-
     async def create_ticket(self, interaction: discord.Interaction, category_name: str):
         # チャンネルの作成処理
         overwrites = {
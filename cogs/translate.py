@@ -5,8 +5,11 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import httpx  # requests から httpx へ変更
+from logging import getLogger
 
 
+logger = getLogger(__name__)
+
 class Translate(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -79,7 +82,7 @@ class Translate(commands.Cog):
         except httpx.RequestError as e:
             # Handle network errors and API errors
             error_message = f"エラーが発生しました: {str(e)}"
-            print(error_message)  # デバッグ用のログ
+            logger.error(error_message)
             await interaction.followup.send(
                 content=error_message,
                 ephemeral=True,
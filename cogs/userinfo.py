@@ -4,6 +4,10 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from core.intents import get_or_fetch_member
+from logging import getLogger
+
+logger = getLogger(__name__)
 
 class UserInfo(commands.Cog):
     def __init__(self, bot):
@@ -39,7 +43,11 @@ class UserInfo(commands.Cog):
 
         # Fetch guild-specific information if available
         if interaction.guild:
-            member = interaction.guild.get_member(user.id)
+            # メンバーキャッシュは無効なことがあるので、なければAPIから取得する
+            if isinstance(user, discord.Member):
+                member = user
+            else:
+                member = await get_or_fetch_member(interaction.guild, user.id)
             if member:
                 joined_at = member.joined_at.strftime('%Y-%m-%d %H:%M:%S UTC')
                 roles = [role.name for role in member.roles if role != interaction.guild.default_role]
@@ -50,7 +58,7 @@ class UserInfo(commands.Cog):
         try:
             await interaction.response.send_message(embed=embed)
         except Exception as error:
-            print(f"Error sending user info: {error}")
+            logger.error(f"Error sending user info: {error}")
             await interaction.response.send_message("コマンドの実行中にエラーが発生しました。", ephemeral=True)
 
 async def setup(bot: commands.Bot):
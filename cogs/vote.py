@@ -7,59 +7,50 @@ from discord.ext import commands, tasks
 from discord.ui import Button, View
 import datetime
 from core.connect import db
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+async def delete_votes(message_ids):
+    # 投票と結果を1つのトランザクションでまとめて削除する
+    async with db.transaction() as transaction:
+        await transaction.delete_many("vote_results", "message_id", message_ids)
+        await transaction.delete_many("votes", "message_id", message_ids)
 
 class Vote(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.check_votes.start()
-        self.bot.loop.create_task(self.init_db())
         self.bot.loop.create_task(self.register_existing_votes())
 
-    async def init_db(self):
-        await db.execute_query("""
-        CREATE TABLE IF NOT EXISTS votes (
-            message_id BIGINT PRIMARY KEY,
-            channel_id BIGINT NOT NULL,
-            title TEXT NOT NULL,
-            options TEXT[] NOT NULL,
-            deadline TIMESTAMP NOT NULL,  
-            creator_id BIGINT NOT NULL
-        );
-        """)
-
-        await db.execute_query("""
-        CREATE TABLE IF NOT EXISTS vote_results (
-            message_id BIGINT NOT NULL,
-            option_index INT NOT NULL,
-            user_id BIGINT NOT NULL,
-            PRIMARY KEY (message_id, user_id)
-        );
-        """)
-
     async def register_existing_votes(self):
         await self.bot.wait_until_ready()
-        votes = await db.execute_query("SELECT message_id, channel_id, options, creator_id FROM votes")
+        votes = await db.fetch("SELECT message_id, channel_id, options, creator_id FROM votes")
 
         if not votes:
             return
 
-        for vote in votes:
-            message_id, channel_id, options, creator_id = vote
-            channel = self.bot.get_channel(channel_id)
-
-            if channel is None:
-                print(f"Channel with ID {channel_id} not found. Skipping message ID {message_id}.")
-                continue
-
-            try:
-                message = await channel.fetch_message(message_id)
-                view = VoteView(bot=self.bot, option_list=options, creator_id=creator_id)
-                await message.edit(view=view)
-
-            except discord.NotFound:
-                print(f"Message with ID {message_id} not found. Deleting from database.")
-                await db.execute_query("DELETE FROM votes WHERE message_id = $1", (message_id,))
-                await db.execute_query("DELETE FROM vote_results WHERE message_id = $1", (message_id,))
+        missing = []
+        try:
+            for vote in votes:
+                message_id, channel_id, options, creator_id = vote
+                channel = self.bot.get_channel(channel_id)
+
+                if channel is None:
+                    logger.warning(f"Channel with ID {channel_id} not found. Skipping message ID {message_id}.")
+                    continue
+
+                try:
+                    message = await channel.fetch_message(message_id)
+                    view = VoteView(bot=self.bot, option_list=options, creator_id=creator_id)
+                    await message.edit(view=view)
+
+                except discord.NotFound:
+                    logger.info(f"Message with ID {message_id} not found. Deleting from database.")
+                    missing.append(message_id)
+        finally:
+            if missing:
+                await delete_votes(missing)
 
     @app_commands.command(name="vote", description="新しい投票を作成します")
     @app_commands.describe(
@@ -104,10 +95,10 @@ class Vote(commands.Cog):
         view = VoteView(bot=self.bot, option_list=option_list, creator_id=interaction.user.id)
         message = await interaction.channel.send(embed=embed, view=view)
 
-        await db.execute_query("""
+        await db.execute("""
         INSERT INTO votes (message_id, channel_id, title, options, deadline, creator_id)
         VALUES ($1, $2, $3, $4, $5, $6)
-        """, (message.id, interaction.channel.id, title, option_list, deadline_dt.replace(tzinfo=None), interaction.user.id))
+        """, message.id, interaction.channel.id, title, option_list, deadline_dt.replace(tzinfo=None), interaction.user.id)
 
         await interaction.response.send_message("投票を作成しました。", ephemeral=True)
 
@@ -116,37 +107,43 @@ class Vote(commands.Cog):
         jst = datetime.timezone(datetime.timedelta(hours=9))
         now = datetime.datetime.now(jst).replace(tzinfo=None)  # タイムゾーンを削除して比較
         
-        results = await db.execute_query("SELECT message_id, channel_id, options FROM votes WHERE deadline <= $1", (now,))
+        try:
+            results = await db.fetch("SELECT message_id, channel_id, options FROM votes WHERE deadline <= $1", now)
+        except Exception as e:
+            # 例外でループが止まらないようにする
+            logger.error(f"期限切れの投票の取得に失敗しました: {e}")
+            return
         
         if not results:
             return
 
-        for row in results:
-            message_id, channel_id, options = row
-            channel = self.bot.get_channel(channel_id)
-            
-            if channel is None:
-                print(f"Channel with ID {channel_id} not found. Skipping message ID {message_id}.")
-                continue
-            
-            try:
-                message = await channel.fetch_message(message_id)
-                view = message.components[0] if message.components else None
-                if view:
-                    await self.display_results(message, options)
-
-                await db.execute_query("DELETE FROM votes WHERE message_id = $1", (message_id,))
-                await db.execute_query("DELETE FROM vote_results WHERE message_id = $1", (message_id,))
-            
-            except discord.NotFound:
-                print(f"Message with ID {message_id} not found in channel {channel_id}. Deleting from database.")
-                await db.execute_query("DELETE FROM votes WHERE message_id = $1", (message_id,))
-                await db.execute_query("DELETE FROM vote_results WHERE message_id = $1", (message_id,))
+        # 終了した投票はまとめて1回で削除する
+        expired = []
+        try:
+            for row in results:
+                message_id, channel_id, options = row
+                channel = self.bot.get_channel(channel_id)
+                
+                if channel is None:
+                    logger.warning(f"Channel with ID {channel_id} not found. Skipping message ID {message_id}.")
+                    continue
+                
+                try:
+                    message = await channel.fetch_message(message_id)
+                    view = message.components[0] if message.components else None
+                    if view:
+                        await self.display_results(message, options)
+                
+                except discord.NotFound:
+                    logger.info(f"Message with ID {message_id} not found in channel {channel_id}. Deleting from database.")
+
+                expired.append(message_id)
+        finally:
+            if expired:
+                await delete_votes(expired)
 
     async def display_results(self, message, options):
-        results = await db.execute_query("SELECT option_index, COUNT(*) FROM vote_results WHERE message_id = $1 GROUP BY option_index", (message.id,))
-        if results is None:
-            results = []
+        results = await db.fetch("SELECT option_index, COUNT(*) FROM vote_results WHERE message_id = $1 GROUP BY option_index", message.id)
 
         total_votes = sum([row[1] for row in results])
         embed = message.embeds[0]
@@ -164,11 +161,11 @@ class Vote(commands.Cog):
         await message.edit(embed=embed, view=None)
 
     async def record_vote(self, message_id, option_index, user_id):
-        await db.execute_query("""
+        await db.execute("""
         INSERT INTO vote_results (message_id, option_index, user_id)
         VALUES ($1, $2, $3)
         ON CONFLICT (message_id, user_id) DO UPDATE SET option_index = $2
-        """, (message_id, option_index, user_id))
+        """, message_id, option_index, user_id)
 
 class VoteView(View):
     def __init__(self, bot, option_list, creator_id):
@@ -188,21 +185,16 @@ class VoteView(View):
         # メッセージIDとボタンのcustom_idからオプションインデックスを取得
         option_index = int(interaction.data['custom_id'].split('_')[-1])
     
-        # ユーザーがすでに投票しているか確認
-        user_vote = await db.execute_query(
-            "SELECT * FROM vote_results WHERE message_id = $1 AND user_id = $2",
-            (interaction.message.id, interaction.user.id)
+        # 未投票の場合のみ記録する (既に投票済みなら行が返らない)
+        recorded = await db.fetchrow(
+            "INSERT INTO vote_results (message_id, option_index, user_id) VALUES ($1, $2, $3) ON CONFLICT (message_id, user_id) DO NOTHING RETURNING option_index",
+            interaction.message.id, option_index, interaction.user.id
         )
     
-        if user_vote:
+        if recorded is None:
             # 既に投票している場合のメッセージ
             await interaction.followup.send("あなたは既に投票しています。", ephemeral=True)
         else:
-            # 投票を記録
-            await db.execute_query(
-                "INSERT INTO vote_results (message_id, option_index, user_id) VALUES ($1, $2, $3) ON CONFLICT (message_id, user_id) DO UPDATE SET option_index = $2",
-                (interaction.message.id, option_index, interaction.user.id)
-            )
             await interaction.followup.send("投票が記録されました。", ephemeral=True)
 
 
@@ -214,7 +206,7 @@ class VoteView(View):
             await interaction.followup.send("投票の終了は作成者のみが可能です。", ephemeral=True)
             return
         
-        results = await db.execute_query("SELECT option_index, COUNT(*) FROM vote_results WHERE message_id = $1 GROUP BY option_index", (interaction.message.id,))
+        results = await db.fetch("SELECT option_index, COUNT(*) FROM vote_results WHERE message_id = $1 GROUP BY option_index", interaction.message.id)
         total_votes = sum(row[1] for row in results)
         embed = interaction.message.embeds[0]
         embed.clear_fields()
@@ -229,8 +221,7 @@ class VoteView(View):
         embed.set_footer(text=f"投票終了時刻: {now.strftime('%Y/%m/%d %H:%M')}")
 
         await interaction.message.edit(embed=embed, view=None)
-        await db.execute_query("DELETE FROM votes WHERE message_id = $1", (interaction.message.id,))
-        await db.execute_query("DELETE FROM vote_results WHERE message_id = $1", (interaction.message.id,))
+        await delete_votes([interaction.message.id])
 
 async def setup(bot):
     await bot.add_cog(Vote(bot))
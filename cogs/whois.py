@@ -4,8 +4,10 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import whois
 from datetime import datetime
+from core.lazy import lazy_import
+
+whois = lazy_import("whois")
 
 class WhoisLookup(commands.Cog):
     def __init__(self, bot):
@@ -3,29 +3,130 @@
 
 from os import listdir
 from logging import getLogger
+from discord import app_commands
 from discord.ext import commands
 import asyncio
+import time
 from core.connect import db  # Import your database connection class
+from core.guildconfig import guild_config
+from core.migrations import migrate
+from core.extensions import load_extensions, startup_report
+from core.commandsync import sync_commands
+from core.shards import shard_monitor
+from core.cluster import cluster
+from core.messages import message_pipeline
+from core.router import component_router
+from core.loopmonitor import label_current_task, loop_monitor
+from core.catalog import command_catalog
+from core.guildsnapshot import guild_snapshot
+from core.ytdl import ytdl_pool
 
 logger = getLogger(__name__)
 
-class MWBot(commands.Bot):
+class CommandTree(app_commands.CommandTree):
+
+    async def interaction_check(self, interaction) -> bool:
+        # Name the invoking task after the command so loop stalls can be traced to it
+        if interaction.command is not None:
+            label_current_task(f"command:{interaction.command.qualified_name}")
+        return True
+
+class MWBot(commands.AutoShardedBot):
+
+    def __init__(self, *args, **kwargs) -> None:
+        kwargs.setdefault("tree_cls", CommandTree)
+        super().__init__(*args, **kwargs)
 
     async def setup_hook(self) -> None:
-        # Ensure the database connection is established
+        # Measure event loop lag and record stalls from the very start
+        loop_monitor.start()
+        # /help and /commands are served from a catalog built from the tree
+        command_catalog.bind(self.tree)
+
+        # Schema migrations and the guild config cache run on every (re)connect
+        db.add_connect_hook(migrate, "マイグレーション")
+        db.add_connect_hook(guild_config.setup, "サーバー設定の読み込み")
+
+        # Ensure the database connection is established. If it fails, the
+        # connection keeps retrying in the background and only DB-backed
+        # commands are affected in the meantime.
+        started = time.perf_counter()
         await db.connect()
-        logger.info("Database connection established")
+        startup_report.phase("database", time.perf_counter() - started)
+        if db.connected:
+            logger.info("Database connection established")
+        else:
+            logger.error("Database unavailable, retrying in the background")
+
+        # Load extensions concurrently; see core.extensions
+        started = time.perf_counter()
+        extensions = ["jishaku"] + [
+            f"cogs.{filename[:-3]}"
+            for filename in sorted(listdir("./cogs"))
+            if filename != "__init__.py" and filename.endswith(".py")
+        ]
+        await load_extensions(self, extensions)
+        startup_report.phase("extensions", time.perf_counter() - started)
+
+        # Only hits the rate-limited sync endpoint when the command tree changed
+        started = time.perf_counter()
+        await sync_commands(self)
+        startup_report.phase("command_sync", time.perf_counter() - started)
+        command_catalog.build()
+
+        startup_report.log()
+
+        # Report stats to launcher.py when running as one of several clusters
+        cluster.start(self)
+        # Guild list for the /admin dashboard, refreshed in the background
+        guild_snapshot.start(self)
+
+    # The command catalog is rebuilt lazily after any extension change
+    async def load_extension(self, name, *, package=None) -> None:
+        await super().load_extension(name, package=package)
+        command_catalog.invalidate()
+
+    async def reload_extension(self, name, *, package=None) -> None:
+        await super().reload_extension(name, package=package)
+        command_catalog.invalidate()
+
+    async def unload_extension(self, name, *, package=None) -> None:
+        await super().unload_extension(name, package=package)
+        command_catalog.invalidate()
+
+    async def on_message(self, message) -> None:
+        # A single pass over each message; cogs register handlers with
+        # message_pipeline instead of adding their own on_message listeners
+        await self.process_commands(message)
+        await message_pipeline.dispatch(message)
+
+    async def on_interaction(self, interaction) -> None:
+        # Component interactions go to exactly one handler by custom_id
+        await component_router.dispatch(interaction)
+
+    async def on_guild_join(self, guild) -> None:
+        guild_snapshot.upsert(guild)
+
+    async def on_guild_update(self, before, after) -> None:
+        guild_snapshot.upsert(after)
+
+    async def on_guild_remove(self, guild) -> None:
+        guild_snapshot.remove(guild.id)
+
+    async def on_shard_connect(self, shard_id: int) -> None:
+        shard_monitor.connected(shard_id)
 
-        # Load extensions
-        await self.load_extension("jishaku")
+    async def on_shard_disconnect(self, shard_id: int) -> None:
+        shard_monitor.disconnected(shard_id)
+        logger.warning(f"Shard {shard_id} disconnected")
 
-        for filename in listdir("./cogs"):
-            if filename != "__init__.py" and filename.endswith(".py"):
-                try:
-                    await self.load_extension(f"cogs.{filename[:-3]}")
-                    logger.info(f"Loaded cog: {filename}")
-                except Exception as e:
-                    logger.error(f"Failed to load cog {filename}: {e}")
+    async def on_shard_resumed(self, shard_id: int) -> None:
+        shard_monitor.resumed(shard_id)
 
-        await self.tree.sync()
-        logger.info("Successfully synced app commands")
+    async def close(self) -> None:
+        # Cogs are unloaded first so they can flush buffered writes
+        await super().close()
+        await db.close()
+        guild_snapshot.stop()
+        ytdl_pool.shutdown()
+        loop_monitor.stop()
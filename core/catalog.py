@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import hashlib
+import json
+from logging import getLogger
+import discord
+from discord import app_commands
+
+logger = getLogger(__name__)
+
+# Embed 1枚あたりのフィールド数の上限
+FIELDS_PER_PAGE = 25
+
+
+class CommandCatalog:
+    """スラッシュコマンドの一覧をbot.treeから一度だけ作り、/help と /commands で使い回します。
+
+    拡張機能の読み込み・再読み込み・解除のたびにinvalidate()され、次に使われるときに作り直されます。
+    """
+
+    def __init__(self):
+        self.tree = None
+        self.stale = True
+        self.commands = []
+        self.body = b""
+        self.etag = ""
+        self.pages = []
+
+    def bind(self, tree):
+        self.tree = tree
+        self.stale = True
+
+    @property
+    def ready(self):
+        return self.tree is not None
+
+    def invalidate(self):
+        self.stale = True
+
+    def _ensure(self):
+        if self.stale and self.tree is not None:
+            self.build()
+
+    def build(self):
+        self.commands = sorted(
+            (
+                {
+                    "name": command.qualified_name,
+                    "description": command.description or "説明なし",
+                }
+                for command in self.tree.walk_commands()
+                if isinstance(command, app_commands.Command)
+            ),
+            key=lambda command: command["name"],
+        )
+        self.body = json.dumps(
+            {"commands": self.commands}, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.pages = self._render_pages()
+        self.stale = False
+        logger.info(f"Built command catalog: {len(self.commands)} commands, {len(self.pages)} help pages")
+
+    def _render_pages(self):
+        pages = []
+        for start in range(0, max(len(self.commands), 1), FIELDS_PER_PAGE):
+            embed = discord.Embed(
+                title="ヘルプ",
+                description="使用可能なスラッシュコマンド一覧",
+                color=0x00FF00,
+            )
+            for command in self.commands[start:start + FIELDS_PER_PAGE]:
+                embed.add_field(name=f"/{command['name']}", value=command["description"], inline=False)
+            pages.append(embed)
+        return pages
+
+    def help_pages(self):
+        """事前に作成したヘルプのEmbedのリストを返します。"""
+        self._ensure()
+        return self.pages
+
+    def json(self):
+        """(JSONのバイト列, ETag) を返します。"""
+        self._ensure()
+        return self.body, self.etag
+
+
+# グローバルインスタンスを作成
+command_catalog = CommandCatalog()
@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import os
+import time
+from logging import getLogger
+from core.shards import shard_monitor
+
+logger = getLogger(__name__)
+
+# ランチャーへ統計情報を送る間隔 (秒)
+STATS_INTERVAL = float(os.getenv("CLUSTER_STATS_INTERVAL", "30"))
+
+
+class ClusterClient:
+    """launcher.pyから起動されたクラスタ側で、ランチャーと統計情報をやり取りします。
+
+    ランチャーなしで main.py を直接起動した場合は無効で、単一プロセスの値を返します。
+    """
+
+    def __init__(self):
+        self.cluster_id = None
+        self.connection = None
+        self.clusters = {}
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.started_at = time.time()
+
+    @property
+    def enabled(self):
+        return self.connection is not None
+
+    def attach(self, cluster_id, connection):
+        self.cluster_id = cluster_id
+        self.connection = connection
+
+    def start(self, bot):
+        if self.enabled and self.task is None:
+            self.task = asyncio.create_task(self._report_loop(bot))
+
+    def local_stats(self, bot):
+        snapshot = shard_monitor.snapshot(bot)
+        return {
+            "cluster_id": self.cluster_id,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at),
+            "guilds": snapshot["guilds"],
+            "latency_ms": round(bot.latency * 1000, 1) if bot.latency == bot.latency else None,
+            "shards": snapshot["shards"],
+        }
+
+    async def exchange(self, bot):
+        """自分の統計情報を送り、全クラスタの最新の統計情報を受け取ります。"""
+        stats = self.local_stats(bot)
+        async with self.lock:
+            # パイプの送受信はブロックするのでスレッドで行う
+            self.clusters = await asyncio.to_thread(self._exchange, stats)
+        return self.clusters
+
+    def _exchange(self, stats):
+        self.connection.send(stats)
+        return self.connection.recv()
+
+    async def _report_loop(self, bot):
+        await bot.wait_until_ready()
+        while not bot.is_closed():
+            try:
+                await self.exchange(bot)
+            except (EOFError, OSError) as e:
+                logger.error(f"Lost connection to the cluster launcher: {e}")
+                return
+            except Exception as e:
+                logger.error(f"Failed to exchange cluster stats: {e}")
+            await asyncio.sleep(STATS_INTERVAL)
+
+    def guild_total(self, bot):
+        """全クラスタ合計のサーバー数を返します。"""
+        if not self.clusters:
+            return len(bot.guilds)
+        # 自分の値は常に最新のものを使う
+        return len(bot.guilds) + sum(
+            stats.get("guilds", 0)
+            for cluster_id, stats in self.clusters.items()
+            if cluster_id != self.cluster_id
+        )
+
+    def snapshot(self, bot):
+        if not self.enabled:
+            return {"clusters": {0: {**self.local_stats(bot), "alive": True}}}
+        return {"clusters": self.clusters}
+
+
+cluster = ClusterClient()
@@ -0,0 +1,64 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import hashlib
+import json
+import os
+from logging import getLogger
+from core.connect import db
+
+logger = getLogger(__name__)
+
+# 1にするとハッシュに関係なく毎回同期する
+FORCE_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+
+
+def command_tree_hash(tree):
+    """グローバルなアプリケーションコマンドの定義から安定したハッシュを計算します。"""
+    payload = []
+    for command in tree.get_commands():
+        try:
+            payload.append(command.to_dict(tree))
+        except TypeError:
+            # discord.py 2.4より前のto_dictは引数を取らない
+            payload.append(command.to_dict())
+    payload.sort(key=lambda data: (data.get("type", 1), data["name"]))
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+async def sync_commands(bot, force=FORCE_SYNC):
+    """コマンド定義が前回の同期から変わったときだけtree.sync()を呼びます。
+
+    同期した場合はTrueを返します。
+    """
+    key = f"command_tree_hash:{bot.application_id}"
+    digest = command_tree_hash(bot.tree)
+
+    stored = None
+    if db.connected and not force:
+        try:
+            stored = await db.fetchval("SELECT value FROM bot_state WHERE key = $1", key)
+        except Exception as e:
+            logger.warning(f"Failed to read the stored command hash: {e}")
+
+    if stored == digest:
+        logger.info("App commands unchanged, skipping sync")
+        return False
+
+    await bot.tree.sync()
+    logger.info(f"Synced app commands ({digest[:12]})")
+
+    if db.connected:
+        try:
+            await db.execute(
+                """
+                INSERT INTO bot_state (key, value) VALUES ($1, $2)
+                ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+                """,
+                key,
+                digest,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store the command hash: {e}")
+    return True
@@ -1,53 +1,370 @@
 import os
+import random
+import re
+import sys
+import time
 import asyncpg
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from logging import getLogger
 from dotenv import load_dotenv
 import asyncio
+from core.metrics import Histogram, Timings
 
 # Load environment variables from .env file
 load_dotenv()
 
-class PostgresConnection:
+logger = getLogger(__name__)
+
+# 接続ごとにキャッシュするプリペアドステートメントの数
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# プールの設定
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# この秒数使われなかった接続は閉じる (0で無効)
+POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+# 1ステートメントあたりのタイムアウト (秒、0で無効)
+STATEMENT_TIMEOUT = float(os.getenv("DB_STATEMENT_TIMEOUT", "10"))
+
+# 再接続の待ち時間 (秒)。失敗するたびに倍になる
+RECONNECT_DELAY = float(os.getenv("DB_RECONNECT_DELAY", "1"))
+RECONNECT_MAX_DELAY = float(os.getenv("DB_RECONNECT_MAX_DELAY", "60"))
+
+# 行数のヒストグラム用バケット
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*$")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![$\w])\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """リテラルと空白を正規化したクエリの識別子を返します。"""
+    normalized = _WHITESPACE.sub(" ", _LITERAL.sub("?", query)).strip()
+    return normalized[:200]
+
+
+# 呼び出し元の特定で読み飛ばすデータベース層のモジュール
+INTERNAL_MODULES = {__name__}
+
+
+def _caller():
+    # データベース層の外側で最初に見つかったモジュール名 (どのcogのクエリか)
+    frame = sys._getframe(2)
+    while frame and frame.f_globals.get("__name__") in INTERNAL_MODULES:
+        frame = frame.f_back
+    return frame.f_globals.get("__name__", "?") if frame else "?"
+
+
+def _row_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, str):
+        # "UPDATE 3" のようなステータス文字列
+        count = result.rsplit(" ", 1)[-1]
+        return int(count) if count.isdigit() else 0
+    return 0 if result is None else 1
+
+
+class DatabaseStats:
+    """クエリごとのレイテンシ・行数・エラー数とプールの待ち時間を集計します。"""
+
+    def __init__(self):
+        self.queries = Timings()
+        self.rows = {}
+        self.acquire_wait = Histogram()
+        self.errors = {}
+
+    def record(self, source, query, elapsed, rows):
+        label = f"{source}: {fingerprint(query)}"
+        self.queries.observe(label, elapsed)
+        histogram = self.rows.get(label)
+        if histogram is None:
+            histogram = self.rows[label] = Histogram(ROW_BUCKETS)
+        histogram.observe(rows)
+
+    def record_error(self, source, query, elapsed, error):
+        label = f"{source}: {fingerprint(query)}"
+        self.queries.observe(label, elapsed)
+        self.queries.error(label)
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def to_dict(self, pool=None):
+        queries = self.queries.to_dict()
+        for label, data in queries.items():
+            rows = self.rows.get(label)
+            data["rows"] = {"total": int(rows.total), "max": int(rows.max)} if rows else {"total": 0, "max": 0}
+        return {
+            "pool": {
+                "size": pool.get_size() if pool else 0,
+                "idle": pool.get_idle_size() if pool else 0,
+                "acquire_wait": self.acquire_wait.to_dict(),
+            },
+            "errors": self.errors,
+            "queries": queries,
+        }
+
+
+class QueryMethods:
+    """fetch/executeなどのクエリAPI。サブクラスは_runを実装します。"""
+
+    async def fetch(self, query, *args, timeout=None):
+        """結果の全行をRecordのリストで返します。"""
+        return await self._run("fetch", query, args, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        """最初の1行を返します。行がなければNoneを返します。"""
+        return await self._run("fetchrow", query, args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        """最初の行の指定カラムの値を返します。行がなければNoneを返します。"""
+        return await self._run("fetchval", query, args, column=column, timeout=timeout)
+
+    async def execute(self, query, *args, timeout=None):
+        """結果行を返さないクエリを実行し、ステータス文字列を返します。"""
+        return await self._run("execute", query, args, timeout=timeout)
+
+    async def executemany(self, query, args, timeout=None):
+        """同じクエリを引数のシーケンスに対してまとめて実行します。"""
+        return await self._run("executemany", query, (args,), timeout=timeout)
+
+    async def delete_many(self, table, column, values, timeout=None):
+        """column = ANY($1) に一致する行を1つのステートメントでまとめて削除します。"""
+        if not (_IDENTIFIER.match(table) and _IDENTIFIER.match(column)):
+            raise ValueError(f"不正な識別子です: {table}.{column}")
+        return await self.execute(
+            f"DELETE FROM {table} WHERE {column} = ANY($1)", list(values), timeout=timeout
+        )
+
+
+class Transaction(QueryMethods):
+    """transaction()が返す、1つの接続に固定されたクエリAPIです。"""
+
+    def __init__(self, db, connection):
+        self.db = db
+        self.connection = connection
+
+    async def _run(self, method, query, args, **kwargs):
+        return await self.db._run(method, query, args, connection=self.connection, **kwargs)
+
+
+class DatabaseUnavailable(Exception):
+    """データベースに接続できていないときに送出されます。"""
+
+    def __init__(self):
+        super().__init__("接続が確立されていません。")
+
+
+# 接続フックの失敗のうち、再接続で直る可能性があるもの
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    DatabaseUnavailable,
+)
+
+
+class PostgresConnection(QueryMethods):
+    dialect = "postgresql"
+
     def __init__(self):
         self.pool = None
+        self.listener = None
+        self.stats = DatabaseStats()
+        self.connect_hooks = []
+        self.reconnect_task = None
+
+    def _connect_kwargs(self):
+        return {
+            "host": os.getenv("DB_HOST"),
+            "port": os.getenv("DB_PORT"),
+            "database": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+        }
+
+    @property
+    def connected(self):
+        return self.pool is not None
+
+    def metrics(self):
+        """インストルメンテーションの集計結果を返します。"""
+        return self.stats.to_dict(self.pool)
+
+    def add_connect_hook(self, hook, label=None):
+        """接続 (再接続を含む) が確立されるたびに呼ばれるコルーチン関数を登録します。
+
+        labelはフックが失敗したときのログに使われます ("マイグレーション" など)。
+        """
+        self.connect_hooks.append((hook, label or hook.__qualname__))
 
     async def connect(self):
         try:
-            self.pool = await asyncpg.create_pool(
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT"),
-                database=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-            )
-            print("PostgreSQLに非同期で接続しました。")
+            await self._create_pool()
         except Exception as e:
-            print(f"接続エラー: {e}")
-            self.pool = None
+            logger.error(f"接続エラー: {e}")
+            # 失敗してもプロセスは止めず、バックグラウンドで再接続を続ける
+            self._schedule_reconnect()
+            return
+        logger.info("PostgreSQLに非同期で接続しました。")
+        if not await self._run_connect_hooks():
+            self._schedule_reconnect()
 
-    async def execute_query(self, query, params=None):
+    async def _create_pool(self):
+        server_settings = {}
+        if STATEMENT_TIMEOUT:
+            server_settings["statement_timeout"] = str(int(STATEMENT_TIMEOUT * 1000))
+        # asyncpgは接続ごとにプリペアドステートメントをLRUでキャッシュするので、
+        # 同じクエリ文字列はパース・プランニングを再利用できる
+        pool = await asyncpg.create_pool(
+            **self._connect_kwargs(),
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=POOL_MAX_INACTIVE_LIFETIME,
+            # サーバー側のタイムアウトが効かない通信断に備えてクライアント側にも余裕を持たせる
+            command_timeout=STATEMENT_TIMEOUT * 2 if STATEMENT_TIMEOUT else None,
+            server_settings=server_settings,
+            statement_cache_size=STATEMENT_CACHE_SIZE,
+        )
+        try:
+            await self._warmup(pool)
+        except Exception:
+            await pool.close()
+            raise
+        self.pool = pool
+
+    async def _warmup(self, pool):
+        # min_size分の接続を同時に借りて、最初のイベントで接続待ちが起きないようにする
+        async def ping():
+            async with pool.acquire() as connection:
+                await connection.execute("SELECT 1")
+
+        await asyncio.gather(*(ping() for _ in range(POOL_MIN_SIZE)))
+
+    async def _run_connect_hooks(self):
+        """フックを1つずつ独立して実行します。接続の問題で失敗したものがあればFalseを返します。"""
+        healthy = True
+        for hook, label in self.connect_hooks:
+            try:
+                await hook()
+            except CONNECTION_ERRORS as e:
+                logger.error(f"{label}中に接続エラーが発生しました: {e}")
+                healthy = False
+            except Exception:
+                # SQLのエラーなどは再接続しても直らないので、記録して残りのフックを続ける
+                logger.exception(f"{label}に失敗しました。")
+        return healthy
+
+    def _schedule_reconnect(self):
+        if self.reconnect_task is None or self.reconnect_task.done():
+            self.reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_DELAY
+        while True:
+            # 複数プロセスが同時に再接続しないように揺らぎを入れる
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            try:
+                if self.pool is None:
+                    await self._create_pool()
+            except Exception as e:
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                logger.warning(f"再接続に失敗しました。{delay:.0f}秒後に再試行します: {e}")
+                continue
+            if await self._run_connect_hooks():
+                logger.info("PostgreSQLに再接続しました。")
+                return
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            logger.warning(f"接続後の処理が接続エラーで失敗しました。{delay:.0f}秒後に再試行します。")
+
+    def acquire(self):
+        """プールから接続を1つ借ります。async withで使用してください。"""
+        if not self.pool:
+            raise DatabaseUnavailable()
+        return self.pool.acquire()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """1つの接続でトランザクションを開き、複数のステートメントをまとめてコミットします。
+
+        async with db.transaction() as transaction:
+            await transaction.execute(...)
+        """
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                yield Transaction(self, connection)
+
+    async def _run(self, method, query, args, connection=None, **kwargs):
+        if connection is not None:
+            return await self._observe(connection, method, query, args, kwargs, _caller())
         if not self.pool:
-            raise Exception("接続が確立されていません。")
+            raise DatabaseUnavailable()
 
+        source = _caller()
+        started = time.perf_counter()
+        async with self.pool.acquire() as connection:
+            self.stats.acquire_wait.observe(time.perf_counter() - started)
+            return await self._observe(connection, method, query, args, kwargs, source)
+
+    async def _observe(self, connection, method, query, args, kwargs, source):
+        started = time.perf_counter()
+        try:
+            result = await getattr(connection, method)(query, *args, **kwargs)
+        except Exception as e:
+            self.stats.record_error(source, query, time.perf_counter() - started, e)
+            raise
+        self.stats.record(source, query, time.perf_counter() - started, _row_count(result))
+        return result
+
+    async def execute_query(self, query, params=None):
+        # 旧API: 新しいコードではfetch/fetchrow/fetchval/executeを使用してください
+        params = params or ()
         try:
-            async with self.pool.acquire() as connection:
-                async with connection.transaction():
-                    if query.strip().upper().startswith("SELECT"):
-                        result = await connection.fetch(query, *params) if params else await connection.fetch(query)
-                        return result
-                    else:
-                        await connection.execute(query, *params) if params else await connection.execute(query)
+            if query.strip().upper().startswith(("SELECT", "WITH")):
+                return await self.fetch(query, *params)
+            await self.execute(query, *params)
         except Exception as e:
-            print(f"クエリエラー: {e}")
+            # エラーはstatsに集計済み
+            logger.error(f"クエリエラー [{fingerprint(query)}]: {e}")
             return None
 
+    async def listen(self, channel, callback):
+        """LISTEN専用の接続でチャンネルを購読し、通知をcallbackへ渡します。"""
+        if self.listener is None or self.listener.is_closed():
+            self.listener = await asyncpg.connect(**self._connect_kwargs())
+            self.listener.add_termination_listener(self._on_listener_lost)
+        await self.listener.add_listener(channel, callback)
+
+    def _on_listener_lost(self, connection):
+        # 切断中の通知は失われるので、再接続時にフックで購読と読み込みをやり直す
+        if connection is self.listener:
+            logger.warning("LISTEN接続が切断されました。再接続します。")
+            self.listener = None
+            self._schedule_reconnect()
+
     async def close(self):
+        if self.reconnect_task:
+            self.reconnect_task.cancel()
+        if self.listener and not self.listener.is_closed():
+            listener, self.listener = self.listener, None
+            await listener.close()
         if self.pool:
             await self.pool.close()
-            print("PostgreSQL接続を閉じました。")
+            logger.info("PostgreSQL接続を閉じました。")
 
 # グローバルインスタンスを作成
-db = PostgresConnection()
+# DB_BACKEND=sqlite ではPostgreSQLなしで同じクエリをSQLiteに対して実行する (テスト・ベンチマーク用)
+if os.getenv("DB_BACKEND", "postgresql").lower() == "sqlite":
+    from core.connect_sqlite import SQLiteConnection
+
+    db = SQLiteConnection(os.getenv("DB_SQLITE_PATH", ":memory:"))
+else:
+    db = PostgresConnection()
 
 # 非同期セットアップ関数
 async def setup():
-    await db.connect()
\ No newline at end of file
+    await db.connect()
@@ -0,0 +1,200 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import datetime
+import json
+import re
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from logging import getLogger
+from core.connect import (
+    INTERNAL_MODULES,
+    DatabaseStats,
+    QueryMethods,
+    Transaction,
+    _caller,
+    _row_count,
+    fingerprint,
+)
+
+logger = getLogger(__name__)
+
+INTERNAL_MODULES.add(__name__)
+
+# 配列はJSON文字列として保存し、宣言型 (INTARRAY/TEXTARRAY) を見てリストに戻す
+sqlite3.register_adapter(list, json.dumps)
+sqlite3.register_adapter(tuple, json.dumps)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("INTARRAY", json.loads)
+sqlite3.register_converter("TEXTARRAY", json.loads)
+sqlite3.register_converter("BOOLEAN", lambda value: value != b"0")
+sqlite3.register_converter(
+    "TIMESTAMP", lambda value: datetime.datetime.fromisoformat(value.decode())
+)
+
+_ANY = re.compile(r"=\s*ANY\s*\(\s*\$(\d+)(?:::\w+\[\])?\s*\)", re.IGNORECASE)
+_CAST = re.compile(r"::\w+(?:\[\])?")
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+_REWRITES = (
+    (re.compile(r"\b(?:BIGINT|INT|INTEGER)\[\]", re.IGNORECASE), "INTARRAY"),
+    (re.compile(r"\bTEXT\[\]", re.IGNORECASE), "TEXTARRAY"),
+    (re.compile(r"\bJSONB\b", re.IGNORECASE), "TEXT"),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "CURRENT_TIMESTAMP"),
+)
+
+
+@lru_cache(maxsize=1024)
+def translate(query):
+    """PostgreSQL向けのクエリをSQLiteで実行できる形に書き換えます。"""
+    # col = ANY($1) は配列 (JSON) を展開したINに置き換える
+    query = _ANY.sub(r"IN (SELECT value FROM json_each(?\1))", query)
+    query = _CAST.sub("", query)
+    for pattern, replacement in _REWRITES:
+        query = pattern.sub(replacement, query)
+    # $n はSQLiteの番号付きプレースホルダ ?n にそのまま対応する
+    return _PLACEHOLDER.sub(r"?\1", query)
+
+
+def _status(cursor, query):
+    # asyncpgと同じ形式のステータス文字列 ("UPDATE 3" など)
+    verb = query.lstrip().split(None, 1)[0].upper()
+    if verb == "INSERT":
+        return f"INSERT 0 {max(cursor.rowcount, 0)}"
+    if verb in ("UPDATE", "DELETE"):
+        return f"{verb} {max(cursor.rowcount, 0)}"
+    return verb
+
+
+class SQLiteSession:
+    """1つのSQLite接続に対するasyncpg互換のクエリAPIです。"""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.connection = owner.connection
+
+    def _execute(self, query, args):
+        return self.connection.execute(translate(query), args)
+
+    async def fetch(self, query, *args, timeout=None):
+        return self._execute(query, args).fetchall()
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return self._execute(query, args).fetchone()
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        row = self._execute(query, args).fetchone()
+        return row[column] if row is not None else None
+
+    async def execute(self, query, *args, timeout=None):
+        return _status(self._execute(query, args), query)
+
+    async def executemany(self, query, args, timeout=None):
+        self.connection.executemany(translate(query), args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+
+class SQLiteConnection(QueryMethods):
+    """PostgresConnectionと同じインターフェースでSQLiteを使うバックエンドです。
+
+    PostgreSQLなしでcogのコードをそのまま動かし、テストやベンチマークで
+    イベントあたりのコストを比較するためのものです。接続は1本だけなので、
+    プールサイズ1のPostgresConnectionと同じように振る舞います。
+    """
+
+    dialect = "sqlite"
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.connection = None
+        self.lock = asyncio.Lock()
+        self.stats = DatabaseStats()
+        self.connect_hooks = []
+        self.listeners = {}
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def metrics(self):
+        return self.stats.to_dict()
+
+    def add_connect_hook(self, hook, label=None):
+        self.connect_hooks.append((hook, label or hook.__qualname__))
+
+    async def connect(self):
+        # 自動コミットにして、トランザクションはtransaction()で明示的に張る
+        self.connection = sqlite3.connect(
+            self.path, detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        # フックは1つずつ独立して実行し、1つの失敗で残りを止めない
+        for hook, label in self.connect_hooks:
+            try:
+                await hook()
+            except Exception:
+                logger.exception(f"{label}に失敗しました。")
+        logger.info(f"SQLite ({self.path}) に接続しました。")
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self.lock:
+            yield SQLiteSession(self)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.acquire() as session:
+            async with session.transaction():
+                yield Transaction(self, session)
+
+    async def _run(self, method, query, args, connection=None, **kwargs):
+        if connection is not None:
+            return await self._observe(connection, method, query, args, kwargs, _caller())
+
+        source = _caller()
+        started = time.perf_counter()
+        async with self.acquire() as session:
+            self.stats.acquire_wait.observe(time.perf_counter() - started)
+            return await self._observe(session, method, query, args, kwargs, source)
+
+    async def _observe(self, session, method, query, args, kwargs, source):
+        # SQLiteではタイムアウトは使わない
+        kwargs.pop("timeout", None)
+        started = time.perf_counter()
+        try:
+            result = await getattr(session, method)(query, *args, **kwargs)
+        except Exception as e:
+            self.stats.record_error(source, query, time.perf_counter() - started, e)
+            raise
+        self.stats.record(source, query, time.perf_counter() - started, _row_count(result))
+        return result
+
+    async def execute_query(self, query, params=None):
+        params = params or ()
+        try:
+            if query.strip().upper().startswith(("SELECT", "WITH")):
+                return await self.fetch(query, *params)
+            await self.execute(query, *params)
+        except Exception as e:
+            logger.error(f"クエリエラー [{fingerprint(query)}]: {e}")
+            return None
+
+    async def listen(self, channel, callback):
+        # SQLiteにはNOTIFYがないので登録だけ行う (書き込み側が直接キャッシュを更新する)
+        self.listeners.setdefault(channel, []).append(callback)
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
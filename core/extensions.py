@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import ast
+import asyncio
+import importlib
+import importlib.util
+import sys
+import time
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class ExtensionTiming:
+    __slots__ = ("name", "import_time", "setup_time", "error")
+
+    def __init__(self, name):
+        self.name = name
+        self.import_time = 0.0
+        self.setup_time = 0.0
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "import": round(self.import_time, 4),
+            "setup": round(self.setup_time, 4),
+            "error": self.error,
+        }
+
+
+class StartupReport:
+    """起動時の各フェーズと拡張機能ごとの読み込み時間を記録します。"""
+
+    def __init__(self):
+        self.phases = {}
+        self.extensions = {}
+
+    def phase(self, name, elapsed):
+        self.phases[name] = elapsed
+
+    def to_dict(self):
+        return {
+            "phases": {name: round(elapsed, 4) for name, elapsed in self.phases.items()},
+            "extensions": [
+                timing.to_dict()
+                for timing in sorted(
+                    self.extensions.values(),
+                    key=lambda timing: timing.import_time + timing.setup_time,
+                    reverse=True,
+                )
+            ],
+        }
+
+    def log(self):
+        for name, elapsed in self.phases.items():
+            logger.info(f"Startup phase {name}: {elapsed:.3f}s")
+        for timing in self.to_dict()["extensions"]:
+            if timing["error"]:
+                logger.error(f"Failed to load {timing['name']}: {timing['error']}")
+            else:
+                logger.info(
+                    f"Loaded {timing['name']}: import {timing['import']:.3f}s, setup {timing['setup']:.3f}s"
+                )
+
+
+startup_report = StartupReport()
+
+
+def _scan(name):
+    """拡張機能のソースを実行せずに解析し、(モジュール直下でimportするモジュール, DEPENDS_ON) を返します。"""
+    origin = importlib.util.find_spec(name).origin
+    with open(origin, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=origin)
+    imports = []
+    depends_on = ()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            imports.append(node.module)
+        elif isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "DEPENDS_ON" for target in node.targets
+        ):
+            depends_on = tuple(ast.literal_eval(node.value))
+    return imports, depends_on
+
+
+def _import_dependencies(name, imports):
+    # スレッドで実行される。読み込み済みのモジュールはsys.modulesのものをそのまま使う
+    for module in imports:
+        if module in sys.modules:
+            continue
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            # 並行したimportのデッドロックなど。load_extensionのときにもう一度importされる
+            logger.warning(f"Could not preimport {module} for {name}, importing it on load: {type(e).__name__}: {e}")
+
+
+async def _preimport(timing):
+    # 拡張機能が使う重い依存ライブラリの読み込みを、スレッドで並行して行う。
+    # 拡張機能のモジュール自体はload_extensionで一度だけ実行し、ここでは実行しない
+    started = time.perf_counter()
+    try:
+        imports, depends_on = await asyncio.to_thread(_scan, timing.name)
+        await asyncio.to_thread(_import_dependencies, timing.name, imports)
+        return depends_on
+    except Exception as e:
+        # 先読みの失敗はキャッシュミスと同じ扱いにし、load_extensionに任せる
+        logger.warning(f"Could not preimport {timing.name}, loading it directly: {type(e).__name__}: {e}")
+        return ()
+    finally:
+        timing.import_time = time.perf_counter() - started
+
+
+async def _setup(bot, timing):
+    started = time.perf_counter()
+    try:
+        await bot.load_extension(timing.name)
+    except Exception as e:
+        timing.error = f"{type(e).__name__}: {e}"
+    finally:
+        timing.setup_time = time.perf_counter() - started
+
+
+def _waves(dependencies):
+    # DEPENDS_ON に書かれた拡張機能が先に読み込まれるよう、依存のない順に段階分けする
+    pending = {
+        name: {dep for dep in depends_on if dep in dependencies}
+        for name, depends_on in dependencies.items()
+    }
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            # 循環している場合は残りをまとめて読み込む
+            ready = list(pending)
+        yield ready
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+
+async def load_extensions(bot, names):
+    """互いに依存しない拡張機能を並行して読み込み、startup_reportに記録します。"""
+    timings = [ExtensionTiming(name) for name in names]
+    for timing in timings:
+        startup_report.extensions[timing.name] = timing
+
+    dependencies = await asyncio.gather(*(_preimport(timing) for timing in timings))
+    # 先読みに失敗した拡張機能も読み込む。本当のエラーはload_extensionが記録する
+    for wave in _waves(dict(zip(names, dependencies))):
+        await asyncio.gather(*(_setup(bot, startup_report.extensions[name]) for name in wave))
@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+from logging import getLogger
+from core.connect import db
+
+logger = getLogger(__name__)
+
+# 設定の変更を通知するチャンネル (core.migrationsのトリガーと揃える)
+CHANNEL = "guild_config"
+
+# テーブル名 -> (ギルドIDのカラム, キャッシュするカラム, ギルドごとに複数行か)
+TABLES = {
+    "settings": ("server_id", ("level_enabled", "notify_channel_id"), False),
+    "invite_tracker_settings": ("guild_id", ("is_enabled", "channel_id"), False),
+    "autoroles": ("server_id", ("role_ids",), False),
+    "auth_roles": ("guild_id", ("role_id",), True),
+}
+
+
+class GuildConfigCache:
+    """ギルドごとの小さな設定テーブルをメモリに保持し、NOTIFYで更新します。"""
+
+    def __init__(self):
+        self.data = {table: {} for table in TABLES}
+        # 実行中の読み直しタスク。参照を持たないと途中でGCされることがある
+        self.tasks = set()
+
+    async def setup(self):
+        # テーブルと通知トリガーはcore.migrationsで作成される
+        # 読み込み前に購読を始めて、その間の変更を取りこぼさないようにする
+        await db.listen(CHANNEL, self._on_notify)
+        await self.load()
+
+    async def load(self):
+        for table, (key, columns, many) in TABLES.items():
+            rows = await db.fetch(f"SELECT {key}, {', '.join(columns)} FROM {table}")
+            data = {}
+            for row in rows:
+                value = {column: row[column] for column in columns}
+                if many:
+                    data.setdefault(row[key], []).append(value)
+                else:
+                    data[row[key]] = value
+            self.data[table] = data
+        logger.info(
+            "Loaded guild config: "
+            + ", ".join(f"{table}={len(data)}" for table, data in self.data.items())
+        )
+
+    def get(self, table, guild_id, default=None):
+        """キャッシュから設定を返します。複数行のテーブルはリストを返します。"""
+        return self.data[table].get(guild_id, default)
+
+    async def refresh(self, table, guild_id):
+        """1ギルド分の設定をデータベースから読み直します。"""
+        key, columns, many = TABLES[table]
+        rows = await db.fetch(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {key} = $1", guild_id
+        )
+        if not rows:
+            self.data[table].pop(guild_id, None)
+        elif many:
+            self.data[table][guild_id] = [dict(row) for row in rows]
+        else:
+            self.data[table][guild_id] = dict(rows[0])
+
+    def _on_notify(self, connection, pid, channel, payload):
+        table, _, guild_id = payload.partition(":")
+        if table in TABLES and guild_id.isdigit():
+            task = asyncio.create_task(self._refresh_logged(table, int(guild_id)))
+            self.tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Guild config refresh task failed: {task.exception()!r}")
+
+    async def _refresh_logged(self, table, guild_id):
+        try:
+            await self.refresh(table, guild_id)
+        except Exception as e:
+            # 読み直せなかった場合は古い値を残さない
+            self.data[table].pop(guild_id, None)
+            logger.error(f"Failed to refresh {table} for guild {guild_id}: {e}")
+
+
+# グローバルインスタンスを作成
+guild_config = GuildConfigCache()
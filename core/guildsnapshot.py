@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import os
+import time
+from logging import getLogger
+import discord
+
+logger = getLogger(__name__)
+
+# キャッシュからの作り直しと、オーナー名・招待リンクの補完を行う間隔 (秒)
+REFRESH_INTERVAL = float(os.getenv("GUILD_SNAPSHOT_INTERVAL", "600"))
+# 1回の補完で問い合わせるサーバー数と、問い合わせの間隔 (秒)
+ENRICH_BATCH = int(os.getenv("GUILD_SNAPSHOT_BATCH", "50"))
+ENRICH_DELAY = 1.0
+
+PLACEHOLDER_ICON = "https://via.placeholder.com/100"
+
+
+class GuildSummary:
+    __slots__ = (
+        "id", "name", "icon_url", "owner_id", "owner_name", "member_count",
+        "invite_url", "search_key", "enriched_at",
+    )
+
+    def __init__(self, guild):
+        self.id = guild.id
+        self.owner_name = None
+        self.invite_url = None
+        self.enriched_at = 0.0
+        self.update(guild)
+
+    def update(self, guild):
+        self.name = guild.name
+        self.icon_url = guild.icon.url if guild.icon else PLACEHOLDER_ICON
+        if getattr(self, "owner_id", None) != guild.owner_id:
+            # オーナーが変わったら名前は取り直す
+            self.owner_name = None
+        self.owner_id = guild.owner_id
+        owner = guild.owner
+        if owner is not None:
+            self.owner_name = owner.name
+        self.member_count = guild.member_count
+        self.search_key = f"{guild.name.casefold()} {guild.id}"
+
+
+class GuildSnapshot:
+    """/admin/ に表示するサーバーの一覧です。
+
+    イベントでキャッシュの内容から差分更新し、REST APIが必要なオーナー名と招待リンクは
+    バックグラウンドで少しずつ補完します。ページを開いてもAPIは呼びません。
+    """
+
+    def __init__(self):
+        self.guilds = {}
+        self.ordered = None
+        self.task = None
+        self.refreshed_at = None
+
+    def start(self, bot):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run(bot))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def upsert(self, guild):
+        summary = self.guilds.get(guild.id)
+        if summary is None:
+            self.guilds[guild.id] = GuildSummary(guild)
+        else:
+            summary.update(guild)
+        self.ordered = None
+
+    def remove(self, guild_id):
+        if self.guilds.pop(guild_id, None) is not None:
+            self.ordered = None
+
+    def rebuild(self, bot):
+        """キャッシュ上のサーバーで作り直します。補完済みの情報は引き継ぎます。"""
+        current = {guild.id for guild in bot.guilds}
+        for guild_id in list(self.guilds):
+            if guild_id not in current:
+                del self.guilds[guild_id]
+        for guild in bot.guilds:
+            self.upsert(guild)
+        self.ordered = None
+        self.refreshed_at = time.time()
+
+    def page(self, query="", page=1, per_page=24):
+        """(そのページのサーバー, 検索に一致した件数) を返します。"""
+        if self.ordered is None:
+            self.ordered = sorted(self.guilds.values(), key=lambda summary: summary.search_key)
+        guilds = self.ordered
+        query = query.strip().casefold()
+        if query:
+            guilds = [summary for summary in guilds if query in summary.search_key]
+        start = (page - 1) * per_page
+        return guilds[start:start + per_page], len(guilds)
+
+    async def _run(self, bot):
+        await bot.wait_until_ready()
+        while not bot.is_closed():
+            try:
+                self.rebuild(bot)
+                await self._enrich(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to refresh guild snapshot: {e}")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+    async def _enrich(self, bot):
+        # 補完が古い順に、1回あたりENRICH_BATCH件まで
+        targets = sorted(
+            (summary for summary in self.guilds.values() if not summary.owner_name or not summary.invite_url),
+            key=lambda summary: summary.enriched_at,
+        )[:ENRICH_BATCH]
+        for summary in targets:
+            guild = bot.get_guild(summary.id)
+            if guild is None:
+                continue
+            if not summary.owner_name:
+                try:
+                    owner = bot.get_user(guild.owner_id) or await bot.fetch_user(guild.owner_id)
+                    summary.owner_name = owner.name
+                except discord.HTTPException:
+                    pass
+            if not summary.invite_url:
+                summary.invite_url = await _find_invite(guild, bot)
+            summary.enriched_at = time.time()
+            await asyncio.sleep(ENRICH_DELAY)
+
+
+async def _find_invite(guild, bot):
+    # ボットが作成した既存の招待を探し、なければ作成する
+    try:
+        for invite in await guild.invites():
+            if invite.inviter and invite.inviter.id == bot.user.id:
+                return invite.url
+    except discord.HTTPException:
+        pass
+    for channel in guild.text_channels:
+        if not channel.permissions_for(guild.me).create_instant_invite:
+            continue
+        try:
+            invite = await channel.create_invite(max_age=0, max_uses=0, unique=False)
+            return invite.url
+        except discord.HTTPException:
+            continue
+    return None
+
+
+# グローバルインスタンスを作成
+guild_snapshot = GuildSnapshot()
@@ -0,0 +1,175 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import ast
+import asyncio
+import os
+from logging import getLogger
+import discord
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = getLogger(__name__)
+
+# メンバーキャッシュ: none (キャッシュしない) / voice (VCにいるメンバーのみ) / full (全員)
+MEMBER_CACHE = os.getenv("MEMBER_CACHE", "voice").strip().lower()
+# メッセージキャッシュの上限 (0で無効)
+MAX_MESSAGES = int(os.getenv("MAX_MESSAGES", "500"))
+# 自動判定に加えて有効にするインテント (カンマ区切り)
+EXTRA_INTENTS = os.getenv("EXTRA_INTENTS", "")
+# 遅延チャンクのタイムアウト (秒)
+CHUNK_TIMEOUT = float(os.getenv("CHUNK_TIMEOUT", "30"))
+
+# イベント名 (on_ を除く) -> 受け取るのに必要なインテント
+EVENT_INTENTS = {
+    "message": ("guild_messages", "dm_messages", "message_content"),
+    "message_edit": ("guild_messages", "dm_messages", "message_content"),
+    "message_delete": ("guild_messages", "dm_messages"),
+    "reaction_add": ("guild_reactions", "dm_reactions"),
+    "reaction_remove": ("guild_reactions", "dm_reactions"),
+    "reaction_clear": ("guild_reactions", "dm_reactions"),
+    "member_join": ("members",),
+    "member_remove": ("members",),
+    "member_update": ("members",),
+    "member_ban": ("moderation",),
+    "member_unban": ("moderation",),
+    "voice_state_update": ("voice_states",),
+    "invite_create": ("invites",),
+    "invite_delete": ("invites",),
+    "typing": ("typing",),
+    "presence_update": ("presences",),
+    "guild_emojis_update": ("emojis_and_stickers",),
+    "integration_create": ("integrations",),
+    "webhooks_update": ("webhooks",),
+    "scheduled_event_create": ("guild_scheduled_events",),
+}
+
+# プレフィックスコマンド (jishakuなど) を使うためのインテント
+PREFIX_INTENTS = ("guild_messages", "dm_messages", "message_content")
+
+
+def _event_name(name):
+    return name.removeprefix("on_").removeprefix("raw_")
+
+
+def _is_listener(decorator):
+    target = decorator.func if isinstance(decorator, ast.Call) else decorator
+    return isinstance(target, ast.Attribute) and target.attr in ("listener", "event")
+
+
+def scan_events(tree):
+    """モジュールのASTからリスナー・wait_for・メッセージハンドラーのイベント名を集めます。"""
+    events = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for decorator in node.decorator_list:
+                if not _is_listener(decorator):
+                    continue
+                name = node.name
+                # @commands.Cog.listener("on_message") のように名前が指定されている場合
+                if isinstance(decorator, ast.Call) and decorator.args:
+                    arg = decorator.args[0]
+                    if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                        name = arg.value
+                events.add(_event_name(name))
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "wait_for"
+            and node.args
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)
+        ):
+            events.add(_event_name(node.args[0].value))
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "register"
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == "message_pipeline"
+        ):
+            # core.messagesのパイプラインに登録されたハンドラーはon_messageと同じ
+            events.add("message")
+    return events
+
+
+def scan_hints(tree):
+    """モジュール直下の INTENTS = (...) を読みます。
+
+    リスナーからは分からない必要なインテント (VCの状態など) を宣言するためのものです。
+    """
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "INTENTS" for target in node.targets
+        ):
+            return set(ast.literal_eval(node.value))
+    return set()
+
+
+def required_intents(paths, prefix_commands=True):
+    """cogのソースを読み込まずに解析し、必要なインテントだけを有効にします。"""
+    intents = discord.Intents.none()
+    intents.guilds = True
+    needed = set(PREFIX_INTENTS) if prefix_commands else set()
+    sources = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        names = set(scan_hints(tree))
+        for event in scan_events(tree):
+            names.update(EVENT_INTENTS.get(event, ()))
+        for name in names:
+            sources.setdefault(name, []).append(os.path.basename(path))
+        needed |= names
+    needed.update(name.strip() for name in EXTRA_INTENTS.split(",") if name.strip())
+    for name in sorted(needed):
+        setattr(intents, name, True)
+    logger.info(
+        "Intents: "
+        + ", ".join(f"{name} ({', '.join(sources.get(name, ['config']))})" for name in sorted(needed))
+    )
+    return intents
+
+
+def member_cache_flags(intents):
+    if MEMBER_CACHE == "full":
+        return discord.MemberCacheFlags.from_intents(intents)
+    if MEMBER_CACHE == "voice" and intents.voice_states:
+        return discord.MemberCacheFlags(voice=True, joined=False)
+    return discord.MemberCacheFlags.none()
+
+
+def client_options(paths, prefix_commands=True):
+    """Botに渡すインテントとキャッシュの設定を返します。"""
+    intents = required_intents(paths, prefix_commands)
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags(intents),
+        # 大きなサーバーでの起動が遅くなるので、メンバーは必要になったときに取得する
+        "chunk_guilds_at_startup": False,
+        "max_messages": MAX_MESSAGES or None,
+    }
+
+
+async def ensure_chunked(guild):
+    """サーバーのメンバー一覧が必要なときに一度だけ取得します。取得できたらTrueを返します。"""
+    if guild.chunked:
+        return True
+    try:
+        await asyncio.wait_for(guild.chunk(cache=True), timeout=CHUNK_TIMEOUT)
+    except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException) as e:
+        # membersインテントが無効な場合はClientException
+        logger.warning(f"Failed to chunk guild {guild.id}: {e}")
+        return False
+    return True
+
+
+async def get_or_fetch_member(guild, user_id):
+    """キャッシュにないメンバーはAPIから取得します。メンバーでなければNoneを返します。"""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import importlib
+import sys
+import time
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# モジュール名 -> 初回使用時のimportにかかった時間 (秒)
+import_times = {}
+
+
+class LazyModule:
+    """最初に属性へアクセスしたときに実際のモジュールをimportする代理オブジェクトです。
+
+    めったに使わないコマンドの重い依存ライブラリを起動時に読み込まないために使います。
+    イベントループを止めたくない場所では先に ``await module.load()`` を呼びます。
+    """
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _import(self):
+        module = self._module
+        if module is None:
+            module = sys.modules.get(self._name)
+            if module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                import_times[self._name] = time.perf_counter() - started
+                logger.info(f"Imported {self._name} on first use in {import_times[self._name]:.3f}s")
+            self._module = module
+        return module
+
+    async def load(self):
+        """スレッドでimportしてモジュールを返します。読み込み済みならそのまま返します。"""
+        if self._module is not None:
+            return self._module
+        return await asyncio.to_thread(self._import)
+
+    def __getattr__(self, name):
+        return getattr(self._import(), name)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name):
+    """``import name`` の代わりに使います。importは最初の使用時まで遅延されます。"""
+    return LazyModule(name)
@@ -0,0 +1,155 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ルートのログレベル
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# ロガーごとのレベル ("cogs.music=WARNING,discord=INFO" の形式)
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# INFO以下のログを間引く割合 ("cogs.music=0.1" なら10件に1件だけ出力する)
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# json (本番向け) / text (開発向け)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# 間引き用のカウンターを保持するログの出力箇所の上限
+MAX_SAMPLING_KEYS = 10000
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecordの標準の属性。これ以外はextraとしてJSONに含める
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+def _parse_pairs(value):
+    pairs = {}
+    for part in value.split(","):
+        name, separator, setting = part.strip().partition("=")
+        if separator and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    """1行に1つのJSONオブジェクトを出力します。"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        task = getattr(record, "taskName", None)
+        if task:
+            entry["task"] = task
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """大量に出るINFO以下のログを、ロガー名の前方一致で指定した割合だけ通します。
+
+    乱数ではなくログを出力した箇所 (ファイルと行) ごとのカウンターで間引くので、
+    f文字列のメッセージでも同じ箇所のログがまとめて数えられ、
+    頻度の低い箇所のログも必ず最初の1件は出力されます。
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        # 長い名前から順に調べて、最も具体的な指定を使う
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.counters = {}
+
+    def _rate(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = getattr(record, "sample_rate", None)
+        if rate is None:
+            rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        key = (record.name, record.pathname, record.lineno)
+        if len(self.counters) >= MAX_SAMPLING_KEYS and key not in self.counters:
+            # 出力箇所の数だけなので通常は届かないが、念のため上限を設ける
+            self.counters.clear()
+        count = self.counters.get(key, 0)
+        self.counters[key] = count + 1
+        return count % round(1 / rate) == 0
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    # 既定のprepareは書式化済みの文字列に置き換えてしまうので、
+    # メッセージと例外だけを文字列にしてレコードの属性は残す
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """ログの出力をキュー経由で別スレッドに任せ、イベントループで書き込まないようにします。"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = LogQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in _parse_pairs(LOG_SAMPLING).items()}
+    handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """キューに残っているログを書き出してから出力スレッドを止めます。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,135 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+from logging import getLogger
+from core.metrics import Histogram
+
+logger = getLogger(__name__)
+
+# ラグを測る間隔 (秒)
+SAMPLE_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.25"))
+# これ以上イベントループが止まったらスタックを記録する (秒)
+STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))
+# 保持する停止記録の数
+MAX_STALLS = 50
+
+LAG_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def label_current_task(label):
+    """実行中のタスクに名前を付けます。停止時のログにコマンドやイベント名として表示されます。"""
+    task = asyncio.current_task()
+    if task is not None:
+        task.set_name(label)
+
+
+class LoopMonitor:
+    """イベントループの遅れを計測し、長く止まったときはその時点のスタックを記録します。
+
+    ループ上のコールバックが一定間隔で時刻を更新し、別スレッドの監視役が
+    更新の途絶えたことを検知して、ループのスレッドのスタックと実行中のタスク名を取得します。
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, threshold=STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram(LAG_BUCKETS)
+        self.stalls = collections.deque(maxlen=MAX_STALLS)
+        self.current_stall = None
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread_id = None
+        self.handle = None
+        self.watchdog = None
+        self.stopped = threading.Event()
+        self.expected = 0.0
+
+    def start(self):
+        if self.loop is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.expected = time.monotonic()
+        self.handle = self.loop.call_soon(self._tick)
+        self.stopped.clear()
+        self.watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.watchdog is not None:
+            # 次のstart()で監視スレッドが2つにならないよう、終了を待つ
+            self.watchdog.join()
+            self.watchdog = None
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        self.loop = None
+
+    def _tick(self):
+        # ループのスレッドで実行される。予定時刻からの遅れがそのままラグになる
+        now = time.monotonic()
+        self.lag.observe(max(now - self.expected, 0.0))
+        with self.lock:
+            stall = self.current_stall
+            self.current_stall = None
+            # 監視スレッドも通常の待ち時間を含めないよう、この予定時刻からの遅れを測る
+            self.expected = now + self.interval
+        if stall is not None:
+            stall["duration"] = round(now - stall["started_monotonic"], 3)
+            logger.warning(
+                f"Event loop was blocked for {stall['duration']:.3f}s by {stall['task']}"
+            )
+        self.handle = self.loop.call_later(self.interval, self._tick)
+
+    def _watch(self):
+        while not self.stopped.wait(self.threshold / 2):
+            with self.lock:
+                blocked = time.monotonic() - self.expected
+                if blocked < self.threshold or self.current_stall is not None:
+                    continue
+                self.current_stall = stall = self._capture(blocked)
+                # to_dict()がループ側で読んでいる間に追加しないよう、ロックの中で追加する
+                self.stalls.append(stall)
+            logger.warning(
+                f"Event loop blocked for over {blocked:.3f}s in {stall['task']}:\n{stall['stack']}"
+            )
+
+    def _capture(self, blocked):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        task = asyncio.current_task(self.loop)
+        return {
+            "at": time.time(),
+            "started_monotonic": self.expected,
+            # ループが再開したときに確定する
+            "duration": round(blocked, 3),
+            "task": task.get_name() if task is not None else "(callback)",
+            "stack": stack,
+        }
+
+    def to_dict(self):
+        with self.lock:
+            stalls = list(self.stalls)
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "lag": self.lag.to_dict(),
+            "stalls": [
+                {key: value for key, value in stall.items() if key != "started_monotonic"}
+                for stall in reversed(stalls)
+            ],
+        }
+
+
+# グローバルインスタンスを作成
+loop_monitor = LoopMonitor()
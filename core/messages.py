@@ -0,0 +1,177 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import time
+from logging import getLogger
+from core.metrics import Histogram, Timings
+from core.loopmonitor import label_current_task
+
+logger = getLogger(__name__)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick法で複数のキーワードを1回の走査で探します。
+
+    キーワードが増えても1メッセージあたりの処理時間は本文の長さにしか依存しません。
+    """
+
+    def __init__(self):
+        self.keywords = {}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [frozenset()]
+
+    def add(self, keyword, value):
+        self.keywords.setdefault(keyword.lower(), set()).add(value)
+
+    def discard(self, value):
+        for keyword in list(self.keywords):
+            self.keywords[keyword].discard(value)
+            if not self.keywords[keyword]:
+                del self.keywords[keyword]
+
+    def build(self):
+        goto = [{}]
+        output = [set()]
+        for keyword, values in self.keywords.items():
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    output.append(set())
+                state = next_state
+            output[state] |= values
+
+        # 幅優先で失敗遷移を作り、失敗先の出力をまとめておく
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                target = fail[state]
+                while target and char not in goto[target]:
+                    target = fail[target]
+                fail[next_state] = goto[target].get(char, 0)
+                output[next_state] |= output[fail[next_state]]
+
+        self.goto = goto
+        self.fail = fail
+        self.output = [frozenset(values) for values in output]
+
+    def search(self, text):
+        """textに含まれるキーワードに対応する値の集合を返します。"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class MessageHandler:
+    __slots__ = ("name", "callback", "keywords", "predicate", "bots", "guild_only")
+
+    def __init__(self, name, callback, keywords, predicate, bots, guild_only):
+        self.name = name
+        self.callback = callback
+        self.keywords = keywords
+        self.predicate = predicate
+        self.bots = bots
+        self.guild_only = guild_only
+
+
+class MessagePipeline:
+    """すべてのon_messageの処理をまとめ、1メッセージにつき1回だけ前処理を行います。
+
+    キーワードを指定したハンドラーはKeywordAutomatonに一致したときだけ、
+    predicateを指定したハンドラーはそれがTrueを返したときだけ呼び出されます。
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.automaton = KeywordAutomaton()
+        self.dirty = False
+        self.timings = Timings()
+        self.prefilter = Histogram()
+        self.messages = 0
+
+    def register(self, name, callback, *, keywords=(), predicate=None, bots=False, guild_only=False):
+        """メッセージハンドラーを登録します。同じ名前で登録すると置き換えます。"""
+        self.unregister(name)
+        self.handlers[name] = MessageHandler(
+            name, callback, tuple(keywords), predicate, bots, guild_only
+        )
+        for keyword in keywords:
+            self.automaton.add(keyword, name)
+        self.dirty = True
+
+    def unregister(self, name):
+        if self.handlers.pop(name, None) is not None:
+            self.automaton.discard(name)
+            self.dirty = True
+
+    def match(self, message):
+        """前処理で一致したハンドラーのリストを返します。"""
+        if self.dirty:
+            self.automaton.build()
+            self.dirty = False
+
+        is_bot = message.author.bot
+        has_guild = message.guild is not None
+        keyword_hits = None
+        matched = []
+        for handler in self.handlers.values():
+            if is_bot and not handler.bots:
+                continue
+            if handler.guild_only and not has_guild:
+                continue
+            if handler.keywords:
+                # キーワードの走査は最初に必要になったときに1回だけ行う
+                if keyword_hits is None:
+                    keyword_hits = self.automaton.search(message.content)
+                if handler.name not in keyword_hits:
+                    continue
+            if handler.predicate is not None and not handler.predicate(message):
+                continue
+            matched.append(handler)
+        return matched
+
+    async def dispatch(self, message):
+        started = time.perf_counter()
+        matched = self.match(message)
+        self.prefilter.observe(time.perf_counter() - started)
+        self.messages += 1
+        if len(matched) == 1:
+            await self._run(matched[0], message)
+        elif matched:
+            await asyncio.gather(*(self._run(handler, message) for handler in matched))
+
+    async def _run(self, handler, message):
+        label_current_task(f"message:{handler.name}")
+        started = time.perf_counter()
+        try:
+            await handler.callback(message)
+        except Exception:
+            self.timings.error(handler.name)
+            logger.exception(f"Message handler {handler.name} failed")
+        finally:
+            self.timings.observe(handler.name, time.perf_counter() - started)
+
+    def metrics(self):
+        return {
+            "messages": self.messages,
+            "handlers": sorted(self.handlers),
+            "prefilter": self.prefilter.to_dict(),
+            "timings": self.timings.to_dict(),
+        }
+
+
+# グローバルインスタンスを作成
+message_pipeline = MessagePipeline()
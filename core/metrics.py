@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+from bisect import bisect_left
+
+# 秒単位のバケット境界 (最後のバケットは上限なし)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """固定バケットのヒストグラム。観測はO(log バケット数)で行えます。"""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """q (0〜1) パーセンタイルが含まれるバケットの上限を返します。"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class Timings:
+    """ラベルごとのHistogramをまとめて保持します。"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.errors = {}
+
+    def observe(self, label, value):
+        histogram = self.histograms.get(label)
+        if histogram is None:
+            histogram = self.histograms[label] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def error(self, label):
+        self.errors[label] = self.errors.get(label, 0) + 1
+
+    def to_dict(self):
+        return {
+            label: {**histogram.to_dict(), "errors": self.errors.get(label, 0)}
+            for label, histogram in sorted(
+                self.histograms.items(), key=lambda item: item[1].total, reverse=True
+            )
+        }
@@ -0,0 +1,232 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+from logging import getLogger
+from core.connect import db
+
+logger = getLogger(__name__)
+
+# 複数プロセスが同時に起動しても1つだけがマイグレーションを実行するためのロックID
+LOCK_ID = 0x4D57_0001
+
+# マイグレーションは通常のステートメントタイムアウトを超えることがある
+MIGRATION_TIMEOUT = 3600
+
+# (バージョン, 名前, SQL文) の順に適用される。適用済みのものは書き換えないこと。
+MIGRATIONS = (
+    (
+        1,
+        "initial schema",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT,
+                server_id BIGINT,
+                xp FLOAT DEFAULT 0,
+                level INT DEFAULT 1,
+                PRIMARY KEY (user_id, server_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS settings (
+                server_id BIGINT PRIMARY KEY,
+                level_enabled BOOLEAN DEFAULT FALSE,
+                notify_channel_id BIGINT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS votes (
+                message_id BIGINT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                title TEXT NOT NULL,
+                options TEXT[] NOT NULL,
+                deadline TIMESTAMP NOT NULL,
+                creator_id BIGINT NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS vote_results (
+                message_id BIGINT NOT NULL,
+                option_index INT NOT NULL,
+                user_id BIGINT NOT NULL,
+                PRIMARY KEY (message_id, user_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS invite_tracker_settings (
+                guild_id BIGINT PRIMARY KEY,
+                is_enabled BOOLEAN NOT NULL,
+                channel_id BIGINT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS invite_tracker (
+                guild_id BIGINT NOT NULL,
+                user_id BIGINT NOT NULL,
+                inviter_id BIGINT,
+                invites INT DEFAULT 0,
+                PRIMARY KEY (guild_id, user_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS autoroles (
+                server_id BIGINT PRIMARY KEY,
+                role_ids TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS auth_roles (
+                guild_id BIGINT,
+                role_id BIGINT,
+                PRIMARY KEY (guild_id, role_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS role_panels (
+                message_id BIGINT PRIMARY KEY,
+                guild_id BIGINT NOT NULL,
+                channel_id BIGINT NOT NULL,
+                role_map JSONB NOT NULL
+            )
+            """,
+        ),
+    ),
+    (
+        2,
+        "guild config notify triggers",
+        (
+            # 行が変わるたびに "テーブル名:ギルドID" をguild_configチャンネルへ通知する
+            """
+            CREATE OR REPLACE FUNCTION notify_guild_config() RETURNS trigger AS $$
+            DECLARE
+                row_data JSONB;
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    row_data := to_jsonb(OLD);
+                ELSE
+                    row_data := to_jsonb(NEW);
+                END IF;
+                PERFORM pg_notify('guild_config', TG_TABLE_NAME || ':' || (row_data ->> TG_ARGV[0]));
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS settings_notify ON settings",
+            """
+            CREATE TRIGGER settings_notify AFTER INSERT OR UPDATE OR DELETE ON settings
+            FOR EACH ROW EXECUTE FUNCTION notify_guild_config('server_id')
+            """,
+            "DROP TRIGGER IF EXISTS invite_tracker_settings_notify ON invite_tracker_settings",
+            """
+            CREATE TRIGGER invite_tracker_settings_notify AFTER INSERT OR UPDATE OR DELETE ON invite_tracker_settings
+            FOR EACH ROW EXECUTE FUNCTION notify_guild_config('guild_id')
+            """,
+            "DROP TRIGGER IF EXISTS autoroles_notify ON autoroles",
+            """
+            CREATE TRIGGER autoroles_notify AFTER INSERT OR UPDATE OR DELETE ON autoroles
+            FOR EACH ROW EXECUTE FUNCTION notify_guild_config('server_id')
+            """,
+            "DROP TRIGGER IF EXISTS auth_roles_notify ON auth_roles",
+            """
+            CREATE TRIGGER auth_roles_notify AFTER INSERT OR UPDATE OR DELETE ON auth_roles
+            FOR EACH ROW EXECUTE FUNCTION notify_guild_config('guild_id')
+            """,
+        ),
+    ),
+    (
+        3,
+        "indexes for hot lookups",
+        (
+            # add_invite / decrement_invite
+            "CREATE INDEX IF NOT EXISTS invite_tracker_inviter_idx ON invite_tracker (guild_id, inviter_id)",
+            # check_votes
+            "CREATE INDEX IF NOT EXISTS votes_deadline_idx ON votes (deadline)",
+            # 集計 (GROUP BY option_index) をインデックスだけで行えるようにする
+            "CREATE INDEX IF NOT EXISTS vote_results_option_idx ON vote_results (message_id, option_index)",
+            # level-server のランキングと無効化時の削除
+            "CREATE INDEX IF NOT EXISTS users_ranking_idx ON users (server_id, level DESC, xp DESC)",
+        ),
+    ),
+    (
+        4,
+        "autoroles.role_ids as BIGINT[]",
+        (
+            """
+            ALTER TABLE autoroles ALTER COLUMN role_ids TYPE BIGINT[]
+            USING string_to_array(NULLIF(role_ids, ''), ',')::BIGINT[]
+            """,
+        ),
+    ),
+    (
+        5,
+        "bot state",
+        (
+            # 再起動をまたいで保持する小さな値 (コマンド定義のハッシュなど)
+            """
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+            """,
+        ),
+    ),
+)
+
+# SQLiteバックエンド (DB_BACKEND=sqlite) ではPostgreSQL固有の文の代わりにこちらを適用する
+SQLITE_MIGRATIONS = {
+    # NOTIFYトリガーはない。書き込み側がキャッシュを直接更新する
+    2: (),
+    # ALTER COLUMN TYPEがないのでテーブルを作り直す。カンマ区切りの数値は [ ] で囲めばJSON配列になる
+    4: (
+        "CREATE TABLE autoroles_new (server_id BIGINT PRIMARY KEY, role_ids BIGINT[])",
+        """
+        INSERT INTO autoroles_new (server_id, role_ids)
+        SELECT server_id, CASE WHEN role_ids IS NULL OR role_ids = '' THEN NULL ELSE '[' || role_ids || ']' END
+        FROM autoroles
+        """,
+        "DROP TABLE autoroles",
+        "ALTER TABLE autoroles_new RENAME TO autoroles",
+    ),
+}
+
+
+async def migrate():
+    """未適用のマイグレーションを番号順に1つずつトランザクションで適用します。"""
+    postgres = db.dialect == "postgresql"
+    async with db.acquire() as connection:
+        if postgres:
+            await connection.execute("SELECT pg_advisory_lock($1)", LOCK_ID)
+        try:
+            await connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+                """
+            )
+            applied = {
+                row["version"]
+                for row in await connection.fetch("SELECT version FROM schema_migrations")
+            }
+            for version, name, statements in MIGRATIONS:
+                if version in applied:
+                    continue
+                if not postgres:
+                    statements = SQLITE_MIGRATIONS.get(version, statements)
+                async with connection.transaction():
+                    if postgres:
+                        await connection.execute("SET LOCAL statement_timeout = 0")
+                    for statement in statements:
+                        await connection.execute(statement, timeout=MIGRATION_TIMEOUT)
+                    await connection.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                        version,
+                        name,
+                    )
+                logger.info(f"Applied migration {version:04d}: {name}")
+        finally:
+            if postgres:
+                await connection.execute("SELECT pg_advisory_unlock($1)", LOCK_ID)
@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import time
+from logging import getLogger
+import discord
+from core.metrics import Timings
+from core.loopmonitor import label_current_task
+
+logger = getLogger(__name__)
+
+# プレフィックスとパラメーターの区切り ("create_ticket:カテゴリー名" など)
+SEPARATOR = ":"
+
+
+class ComponentRouter:
+    """ボタンやセレクトメニューのcustom_idから、対応するハンドラーを1つだけ呼び出します。
+
+    完全一致のルートは callback(interaction)、プレフィックスのルート
+    ("create_ticket:" のように区切り文字で終わるもの) は残りの文字列を付けて
+    callback(interaction, value) で呼び出されます。どちらも辞書を1〜2回引くだけです。
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self.timings = Timings()
+        self.unrouted = 0
+
+    def register(self, custom_id, callback):
+        if custom_id.endswith(SEPARATOR):
+            self.prefixes[custom_id] = callback
+        else:
+            self.exact[custom_id] = callback
+
+    def unregister(self, custom_id):
+        self.exact.pop(custom_id, None)
+        self.prefixes.pop(custom_id, None)
+
+    def resolve(self, custom_id):
+        """(ルート名, ハンドラー, 引数) を返します。見つからなければNoneです。"""
+        callback = self.exact.get(custom_id)
+        if callback is not None:
+            return custom_id, callback, ()
+        head, separator, value = custom_id.partition(SEPARATOR)
+        if separator:
+            route = head + separator
+            callback = self.prefixes.get(route)
+            if callback is not None:
+                return route, callback, (value,)
+        return None
+
+    async def dispatch(self, interaction: discord.Interaction):
+        if interaction.type is not discord.InteractionType.component:
+            return
+        custom_id = (interaction.data or {}).get("custom_id")
+        resolved = self.resolve(custom_id) if custom_id else None
+        if resolved is None:
+            # add_viewで登録したViewなど、ここで扱わないコンポーネント
+            self.unrouted += 1
+            return
+
+        route, callback, args = resolved
+        label_current_task(f"component:{route}")
+        started = time.perf_counter()
+        try:
+            await callback(interaction, *args)
+        except Exception:
+            self.timings.error(route)
+            logger.exception(f"Component handler for {route} failed")
+        finally:
+            self.timings.observe(route, time.perf_counter() - started)
+
+    def metrics(self):
+        return {
+            "routes": sorted([*self.exact, *self.prefixes]),
+            "unrouted": self.unrouted,
+            "timings": self.timings.to_dict(),
+        }
+
+
+# グローバルインスタンスを作成
+component_router = ComponentRouter()
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import os
+import time
+
+
+def shard_config():
+    """環境変数からシャード数と担当するシャードIDを読み込みます。
+
+    SHARD_COUNTが空ならDiscordの推奨値を使います。SHARD_IDSは "0,1,2" や
+    "0-3" の形式で指定し、空なら全シャードを担当します。
+    """
+    count = os.getenv("SHARD_COUNT", "").strip()
+    ids = os.getenv("SHARD_IDS", "").strip()
+    shard_count = int(count) if count else None
+    shard_ids = None
+    if ids:
+        shard_ids = []
+        for part in ids.split(","):
+            start, _, end = part.strip().partition("-")
+            shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_count, shard_ids
+
+
+class ShardStats:
+    __slots__ = ("connects", "disconnects", "resumes", "last_disconnect")
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.resumes = 0
+        self.last_disconnect = None
+
+
+class ShardMonitor:
+    """シャードごとの接続・切断・再開の回数を記録します。"""
+
+    def __init__(self):
+        self.shards = {}
+
+    def _get(self, shard_id):
+        stats = self.shards.get(shard_id)
+        if stats is None:
+            stats = self.shards[shard_id] = ShardStats()
+        return stats
+
+    def connected(self, shard_id):
+        self._get(shard_id).connects += 1
+
+    def disconnected(self, shard_id):
+        stats = self._get(shard_id)
+        stats.disconnects += 1
+        stats.last_disconnect = time.time()
+
+    def resumed(self, shard_id):
+        self._get(shard_id).resumes += 1
+
+    def guild_counts(self, bot):
+        counts = {shard_id: 0 for shard_id in bot.shards}
+        for guild in bot.guilds:
+            counts[guild.shard_id] = counts.get(guild.shard_id, 0) + 1
+        return counts
+
+    def snapshot(self, bot):
+        counts = self.guild_counts(bot)
+        shards = []
+        for shard_id, shard in sorted(bot.shards.items()):
+            stats = self._get(shard_id)
+            latency = shard.latency
+            shards.append(
+                {
+                    "id": shard_id,
+                    "guilds": counts.get(shard_id, 0),
+                    "latency_ms": round(latency * 1000, 1) if latency == latency else None,
+                    "closed": shard.is_closed(),
+                    "connects": stats.connects,
+                    # 最初の接続以降の再接続回数
+                    "reconnects": max(stats.connects - 1, 0) + stats.resumes,
+                    "disconnects": stats.disconnects,
+                    "last_disconnect": stats.last_disconnect,
+                }
+            )
+        return {"shard_count": bot.shard_count, "guilds": len(bot.guilds), "shards": shards}
+
+
+shard_monitor = ShardMonitor()
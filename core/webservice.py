@@ -1,25 +1,46 @@
 # SPDX-License-Identifier: CC-BY-NC-SA-4.0
 # Author: Miriel (@mirielnet)
 
-import asyncio
 import secrets
-import aiofiles
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.responses import HTMLResponse, PlainTextResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.staticfiles import StaticFiles
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from dotenv import load_dotenv
+from core.connect import db
+from core.extensions import startup_report
+from core.shards import shard_monitor
+from core.cluster import cluster
+from core.messages import message_pipeline
+from core.router import component_router
+from core.loopmonitor import loop_monitor
+from core.guildsnapshot import guild_snapshot
+from core.ytdl import ytdl_pool
 
 load_dotenv()
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
 
+# 管理画面のテンプレートは起動時に一度だけ読み込んでコンパイルする
+templates = Environment(
+    loader=FileSystemLoader("static/admin"), autoescape=select_autoescape(["html"])
+)
+index_template = templates.get_template("index.html")
+GUILDS_PER_PAGE = 24
+
 # FastAPI and authentication setup
 security = HTTPBasic()
 
+# main.pyから渡されるボットのインスタンス
+bot = None
+
+def bind_bot(instance):
+    global bot
+    bot = instance
+
 def authenticate(credentials: HTTPBasicCredentials = Depends(security)):
     correct_username = secrets.compare_digest(credentials.username, ADMIN_USERNAME)
     correct_password = secrets.compare_digest(credentials.password, ADMIN_PASSWORD)
@@ -42,42 +63,58 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Route definitions
 @app.get("/admin/", response_class=HTMLResponse, dependencies=[Depends(authenticate)])
-async def read_index(request: Request, bot):
-    guilds_info = []
-    for guild in bot.guilds:
-        icon_url = guild.icon.url if guild.icon else "https://via.placeholder.com/100"
-        owner = await bot.fetch_user(guild.owner_id)
-        invite_url = await get_existing_invite(guild, bot)
-        guilds_info.append(
-            {
-                "name": guild.name,
-                "icon_url": icon_url,
-                "owner_name": owner.name,
-                "invite_url": invite_url,
-            }
-        )
-    async with aiofiles.open("static/admin/index.html", mode="r", encoding="utf-8") as f:
-        template = Template(await f.read())
-    content = template.render(server_count=len(bot.guilds), guilds=guilds_info)
+async def read_index(request: Request, page: int = 1, q: str = ""):
+    # サーバー一覧はguild_snapshotが保持しており、ページの表示ではAPIを呼ばない
+    page = max(page, 1)
+    guilds, total = guild_snapshot.page(q, page, GUILDS_PER_PAGE)
+    content = index_template.render(
+        server_count=cluster.guild_total(bot),
+        guilds=guilds,
+        total=total,
+        page=page,
+        pages=max((total + GUILDS_PER_PAGE - 1) // GUILDS_PER_PAGE, 1),
+        q=q,
+    )
     return HTMLResponse(content=content)
 
-# Other utility functions
-async def get_existing_invite(guild, bot):
-    for channel in guild.text_channels:
-        try:
-            invites = await channel.invites()
-            for invite in invites:
-                if invite.inviter.id == bot.user.id:
-                    return invite.url
-        except discord.Forbidden:
-            continue
-    return await create_invite(guild, bot)
-
-async def create_invite(guild, bot):
-    for channel in guild.text_channels:
-        try:
-            invite = await channel.create_invite(max_age=0, max_uses=0)
-            return invite.url
-        except discord.Forbidden:
-            continue
-    return "招待リンクを作成できませんでした。"
+@app.get("/admin/metrics/db", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_db_metrics():
+    # クエリごとのレイテンシ・行数・エラー数とプールの待ち時間
+    return JSONResponse(content=db.metrics())
+
+@app.get("/admin/startup", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_startup_report():
+    # 起動フェーズと拡張機能ごとのimport/setup時間
+    return JSONResponse(content=startup_report.to_dict())
+
+@app.get("/admin/shards", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_shards():
+    # シャードごとのサーバー数・レイテンシ・再接続回数
+    return JSONResponse(content=shard_monitor.snapshot(bot))
+
+@app.get("/admin/metrics/messages", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_message_metrics():
+    # メッセージごとの前処理時間とハンドラーごとの処理時間
+    return JSONResponse(content=message_pipeline.metrics())
+
+@app.get("/admin/metrics/components", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_component_metrics():
+    # custom_idのルートごとの処理時間とエラー数
+    return JSONResponse(content=component_router.metrics())
+
+@app.get("/admin/metrics/ytdl", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_ytdl_metrics():
+    # yt_dlpの抽出の待ち件数・拒否数・タイムアウト数と処理時間
+    return JSONResponse(content=ytdl_pool.metrics())
+
+@app.get("/admin/loop", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_loop_metrics():
+    # イベントループの遅れのパーセンタイルと、止まったときのスタック
+    return JSONResponse(content=loop_monitor.to_dict())
+
+@app.get("/admin/clusters", response_class=JSONResponse, dependencies=[Depends(authenticate)])
+async def read_clusters():
+    # クラスタごとのサーバー数・シャード・最終報告時刻 (launcher.pyで起動した場合)
+    snapshot = cluster.snapshot(bot)
+    snapshot["guilds"] = cluster.guild_total(bot)
+    return JSONResponse(content=snapshot)
@@ -0,0 +1,320 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+import asyncio
+import collections
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from logging import getLogger
+from core.lazy import lazy_import
+from core.metrics import Timings
+
+logger = getLogger(__name__)
+
+youtube_dl = lazy_import("yt_dlp")
+
+# 抽出を行うスレッド数
+WORKERS = int(os.getenv("YTDL_WORKERS", "4"))
+# 実行中と待機中を合わせた抽出の上限。超えたらExtractionBusyで断る
+MAX_PENDING = int(os.getenv("YTDL_MAX_PENDING", "32"))
+# 1つのサーバーで同時に行う抽出の数
+GUILD_CONCURRENCY = int(os.getenv("YTDL_GUILD_CONCURRENCY", "2"))
+# 1回の抽出を待つ時間 (秒)
+EXTRACT_TIMEOUT = float(os.getenv("YTDL_TIMEOUT", "30"))
+# キャッシュするクエリの数
+CACHE_SIZE = int(os.getenv("YTDL_CACHE_SIZE", "512"))
+# キャッシュの最長保持時間 (秒)。ストリームURLに期限があればそちらが優先される
+CACHE_TTL = float(os.getenv("YTDL_CACHE_TTL", "3600"))
+# ストリームURLの期限よりこれだけ早く破棄する (秒)。再生中に期限が切れないようにする
+EXPIRY_MARGIN = 600
+
+# 署名付きストリームURLの期限 (?expire=1700000000 や /expire/1700000000/)
+EXPIRE_PATTERN = re.compile(r"[?&/]expire[=/](\d+)")
+# キャッシュのキーを作るときにYouTubeのURLから取り除く共有用のパラメーター (utm_* はすべてのURLから取り除く)
+# t (再生開始位置) はyt_dlpが読むので残す
+IGNORED_PARAMS = {"feature", "si", "pp", "start_radio", "ab_channel"}
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "www.youtube.com"}
+
+_COMMON_OPTIONS = {
+    "nocheckcertificate": True,
+    "ignoreerrors": False,
+    "logtostderr": False,
+    "quiet": True,
+    "no_warnings": True,
+    "cookiefile": "./yt-cookie.txt",
+    # ワーカーが応答のない接続で止まり続けないようにする
+    "socket_timeout": 15,
+}
+
+# 用途ごとのYoutubeDLの設定。インスタンスはスレッドごとに1つずつ作って使い回す
+PROFILES = {
+    "stream": {
+        **_COMMON_OPTIONS,
+        "format": "bestaudio/best",
+        "outtmpl": "%(extractor)s-%(id)s-%(title)s.%(ext)s",
+        "restrictfilenames": True,
+        "noplaylist": False,  # Allow playlists
+        # プレイリストの各曲は解決せず、タイトルとURLだけを取得する
+        "extract_flat": "in_playlist",
+        "default_search": "auto",
+        "source_address": "0.0.0.0",
+    },
+    "search": {
+        **_COMMON_OPTIONS,
+        "format": "bestaudio",
+        "noplaylist": True,
+    },
+}
+
+
+class ExtractionBusy(Exception):
+    """抽出の待ちが上限に達しているときに送出されます。"""
+
+
+def cache_key(profile, query):
+    """同じ曲・同じ検索が同じキーになるように、URLや検索語を正規化します。"""
+    if "://" not in query:
+        return profile, " ".join(query.casefold().split())
+    parts = urlsplit(query.strip())
+    host = parts.netloc.lower()
+    path = parts.path
+    youtube = host == "youtu.be" or host in YOUTUBE_HOSTS
+    # 共有用のパラメーターはYouTubeのURLだけで取り除く。他のサイトでは意味を持つことがある
+    params = [
+        (name, value) for name, value in parse_qsl(parts.query)
+        if not name.startswith("utm_") and not (youtube and name in IGNORED_PARAMS)
+    ]
+    if host == "youtu.be":
+        host, params, path = "www.youtube.com", [("v", path.strip("/")), *params], "/watch"
+    elif host in YOUTUBE_HOSTS:
+        host = "www.youtube.com"
+    return profile, urlunsplit(("https", host, path.rstrip("/") or "/", urlencode(sorted(params)), ""))
+
+
+def stream_expiry(data):
+    """抽出結果に含まれるストリームURLのうち、最も早い期限 (UNIX時刻) を返します。"""
+    expiry = None
+    for entry in data.get("entries") or (data,):
+        if not entry:
+            continue
+        match = EXPIRE_PATTERN.search(entry.get("url") or "")
+        if match is not None:
+            value = int(match.group(1))
+            expiry = value if expiry is None else min(expiry, value)
+    return expiry
+
+
+class ExtractionCache:
+    """抽出結果をクエリごとに保持するLRUキャッシュです。
+
+    ストリームURLの期限が分かる場合は期限の少し前まで、分からない場合はCACHE_TTLの間保持します。
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+            del self.entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        now = time.time()
+        expires_at = now + self.ttl
+        expiry = stream_expiry(data)
+        if expiry is not None:
+            expires_at = min(expires_at, expiry - EXPIRY_MARGIN)
+        if expires_at <= now:
+            return
+        self.entries[key] = (expires_at, data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def to_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ExtractionPool:
+    """yt_dlpの抽出を専用のスレッドプールで実行します。
+
+    YoutubeDLのインスタンスはスレッドごとに使い回し、サーバーごとの同時実行数と
+    全体の待ち件数に上限を設けます。タイムアウトやキャンセルの際、まだ始まっていない
+    抽出は取り消されます。実行中のものはsocket_timeoutで打ち切られるまで待ち件数に数えます。
+    結果はExtractionCacheに保持し、同じクエリの同時の抽出は1回にまとめます。
+    待っている呼び出し元がすべてキャンセルされた抽出は取り消されます。
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING, guild_concurrency=GUILD_CONCURRENCY):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.guild_concurrency = guild_concurrency
+        self.executor = None
+        self.local = threading.local()
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        # サーバーID -> [Semaphore, 使用中のタスク数]
+        self.guild_limits = {}
+        self.timings = Timings()
+        self.rejected = 0
+        self.timeouts = 0
+        self.cache = ExtractionCache()
+        # キャッシュのキー -> [実行中の抽出のTask, 待っている呼び出し元の数]
+        self.inflight = {}
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ytdl")
+        return self.executor
+
+    def _ytdl(self, profile):
+        # ワーカースレッドで実行される
+        instances = getattr(self.local, "instances", None)
+        if instances is None:
+            instances = self.local.instances = {}
+        ytdl = instances.get(profile)
+        if ytdl is None:
+            ytdl = instances[profile] = youtube_dl.YoutubeDL(PROFILES[profile])
+        return ytdl
+
+    def _extract(self, query, profile):
+        return self._ytdl(profile).extract_info(query, download=False)
+
+    def _release(self, _future):
+        with self.pending_lock:
+            self.pending -= 1
+
+    def _acquire_guild(self, guild_id):
+        limit = self.guild_limits.get(guild_id)
+        if limit is None:
+            limit = self.guild_limits[guild_id] = [asyncio.Semaphore(self.guild_concurrency), 0]
+        limit[1] += 1
+        return limit
+
+    def _release_guild(self, guild_id, limit):
+        limit[1] -= 1
+        if limit[1] == 0:
+            # 使われなくなったサーバーの分は残さない
+            del self.guild_limits[guild_id]
+
+    async def extract(self, query, *, guild_id=None, profile="stream", timeout=EXTRACT_TIMEOUT):
+        """extract_info(query, download=False) の結果を返します。キャッシュにあれば即座に返します。"""
+        key = cache_key(profile, query)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+        shared = self.inflight.get(key)
+        if shared is None:
+            task = asyncio.create_task(
+                self._fetch(key, query, guild_id, profile, timeout), name=f"ytdl:{profile}"
+            )
+            # 待っている呼び出し元がいなくなっても "exception was never retrieved" を出さない
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            shared = self.inflight[key] = [task, 0]
+        # 同じクエリの抽出が実行中ならその結果を待つ。待っている呼び出し元が
+        # すべてキャンセルされたら、抽出も取り消してプールの枠を空ける
+        task = shared[0]
+        shared[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            shared[1] -= 1
+            if shared[1] == 0 and not task.done():
+                task.cancel()
+
+    async def _fetch(self, key, query, guild_id, profile, timeout):
+        try:
+            data = await self._submit(query, guild_id, profile, timeout)
+            self.cache.put(key, data)
+            return data
+        finally:
+            del self.inflight[key]
+
+    async def _submit(self, query, guild_id, profile, timeout):
+        with self.pending_lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExtractionBusy(f"{self.pending} extractions are already pending")
+            self.pending += 1
+        try:
+            await youtube_dl.load()
+        except BaseException:
+            self._release(None)
+            raise
+
+        limit = self._acquire_guild(guild_id)
+        started = time.perf_counter()
+        future = None
+        try:
+            async with limit[0]:
+                future = self._executor().submit(self._extract, query, profile)
+                future.add_done_callback(self._release)
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.timings.error(profile)
+            logger.warning(f"Extraction of {query} timed out after {timeout}s")
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.timings.error(profile)
+            raise
+        finally:
+            if future is None:
+                # セマフォを待っている間にキャンセルされた
+                self._release(None)
+            else:
+                future.cancel()
+            self._release_guild(guild_id, limit)
+            self.timings.observe(profile, time.perf_counter() - started)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "busy_guilds": len(self.guild_limits),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "inflight": len(self.inflight),
+            "cache": self.cache.to_dict(),
+            "timings": self.timings.to_dict(),
+        }
+
+
+# グローバルインスタンスを作成
+ytdl_pool = ExtractionPool()
@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+# 複数のプロセス (クラスタ) でシャードを分担して起動するランチャー
+# 使い方: python launcher.py  (CLUSTER_COUNT / SHARD_COUNT で台数を指定)
+
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+
+import httpx
+from dotenv import load_dotenv
+from logging import getLogger
+from core.logconfig import setup_logging
+
+load_dotenv()
+
+setup_logging()
+logger = getLogger("launcher")
+
+# 落ちたクラスタを再起動するまでの待ち時間 (秒)
+RESTART_DELAY = 5
+
+
+def recommended_shard_count(token):
+    response = httpx.get(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}"},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()["shards"]
+
+
+def split_shards(shard_count, cluster_count):
+    """シャードIDを連続した範囲でクラスタに割り当てます。"""
+    cluster_count = min(cluster_count, shard_count)
+    base, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for index in range(cluster_count):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def run_cluster(cluster_id, shard_ids, shard_count, connection):
+    # 子プロセスのエントリポイント。main.pyはimport時にボットを作るので先に環境変数を設定する
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    os.environ["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    os.environ["CLUSTER_ID"] = str(cluster_id)
+    # Webサーバーはクラスタ0だけが起動する
+    os.environ["WEB_ENABLED"] = "1" if cluster_id == 0 else "0"
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from core.cluster import cluster
+
+    cluster.attach(cluster_id, connection)
+
+    import main
+
+    main.run()
+
+
+class Cluster:
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.connection = None
+        self.stats = {}
+        self.last_seen = None
+        self.restarts = 0
+
+    def start(self, context):
+        parent, child = context.Pipe()
+        self.connection = parent
+        self.process = context.Process(
+            target=run_cluster,
+            args=(self.cluster_id, self.shard_ids, self.shard_count, child),
+            name=f"cluster-{self.cluster_id}",
+        )
+        self.process.start()
+        child.close()
+        logger.info(
+            f"Started cluster {self.cluster_id} (pid {self.process.pid}) for shards {self.shard_ids}"
+        )
+
+    def close_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def status(self):
+        return {
+            **self.stats,
+            "cluster_id": self.cluster_id,
+            "shard_ids": self.shard_ids,
+            "alive": self.process is not None and self.process.is_alive(),
+            "last_seen": self.last_seen,
+            "restarts": self.restarts,
+        }
+
+
+def main():
+    token = os.getenv("DISCORD_TOKEN")
+    shard_count = int(os.getenv("SHARD_COUNT") or recommended_shard_count(token))
+    cluster_count = int(os.getenv("CLUSTER_COUNT") or os.cpu_count() or 1)
+
+    context = multiprocessing.get_context("spawn")
+    clusters = [
+        Cluster(cluster_id, shard_ids, shard_count)
+        for cluster_id, shard_ids in enumerate(split_shards(shard_count, cluster_count))
+    ]
+    logger.info(f"Launching {len(clusters)} clusters for {shard_count} shards")
+    for item in clusters:
+        item.start(context)
+
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    restart_at = {}
+    while running:
+        # 終了したクラスタの接続とsentinelは、再起動するまで待ち対象に含めない
+        by_connection = {item.connection: item for item in clusters if item.connection is not None}
+        by_sentinel = {
+            item.process.sentinel: item for item in clusters if item.cluster_id not in restart_at
+        }
+        for ready in wait([*by_connection, *by_sentinel], timeout=1):
+            item = by_connection.get(ready)
+            if item is None:
+                continue
+            # 統計情報を受け取り、全クラスタ分をまとめて返す
+            try:
+                item.stats = ready.recv()
+                item.last_seen = time.time()
+                ready.send({other.cluster_id: other.status() for other in clusters})
+            except (EOFError, OSError):
+                # 子プロセスが終了した。再起動は下の終了コードの確認で行う
+                item.close_connection()
+
+        # 再起動はrecv()の成否ではなくプロセスの終了コードで判断する
+        for item in clusters:
+            if item.cluster_id not in restart_at and item.process.exitcode is not None:
+                item.close_connection()
+                logger.error(
+                    f"Cluster {item.cluster_id} exited with code {item.process.exitcode}, restarting in {RESTART_DELAY}s"
+                )
+                restart_at[item.cluster_id] = time.time() + RESTART_DELAY
+
+        for item in clusters:
+            if item.cluster_id in restart_at and time.time() >= restart_at[item.cluster_id]:
+                del restart_at[item.cluster_id]
+                item.restarts += 1
+                item.start(context)
+
+    logger.info("Stopping clusters")
+    for item in clusters:
+        if item.process.is_alive():
+            item.process.terminate()
+    for item in clusters:
+        item.process.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
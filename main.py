@@ -2,19 +2,22 @@
 # Author: Miriel (@mirielnet) and tuna2134
 
 import discord
-import logging
 import os
 import asyncio
 import core.webservice as webservice
 from dotenv import load_dotenv
 import core.connect
-from discord.ext import commands, tasks
+from discord.ext import tasks
 from core.bot import MWBot
+from core.shards import shard_config, shard_monitor
+from core.cluster import cluster
+from core.intents import client_options
+from core.logconfig import setup_logging
+from core.catalog import command_catalog
+from logging import getLogger
 import uvicorn
-from fastapi.responses import JSONResponse
-import importlib.util
-import inspect
-from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from version import BOT_VERSION
 
@@ -22,29 +25,48 @@ from version import BOT_VERSION
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger(__name__)
+# ログ設定 (キュー経由で別スレッドから出力する。LOG_LEVEL / LOG_LEVELS / LOG_SAMPLING / LOG_FORMAT)
+setup_logging()
+logger = getLogger(__name__)
 
 # Discordボットの設定
-intents = discord.Intents.all()
-bot = MWBot(command_prefix="!", intents=intents)
+# インテントとメンバーキャッシュは読み込むcogのリスナーから必要な分だけ有効にする (core.intents)
+cog_paths = [
+    os.path.join("./cogs", filename)
+    for filename in sorted(os.listdir("./cogs"))
+    if filename != "__init__.py" and filename.endswith(".py")
+]
+# シャード数は SHARD_COUNT / SHARD_IDS で指定 (未指定ならDiscordの推奨値)
+shard_count, shard_ids = shard_config()
+bot = MWBot(
+    command_prefix="!",
+    shard_count=shard_count,
+    shard_ids=shard_ids,
+    **client_options(cog_paths),
+)
+webservice.bind_bot(bot)
 
 # ボットが接続したときのイベント
 @bot.event
 async def on_ready():
-    update_status.start()
+    # on_readyは再接続のたびに呼ばれることがある
+    if not update_status.is_running():
+        update_status.start()
     logger.info(f"{bot.user}がDiscordに接続されました。")
 
 # ステータス更新タスク
 @tasks.loop(minutes=5)
 async def update_status():
-    server_count = len(bot.guilds)
-    activity = discord.Game(name=f"/help / {BOT_VERSION} / {server_count} servers")
-    await bot.change_presence(status=discord.Status.online, activity=activity)
-    logger.info(f"Status updated: {server_count} servers")
+    # launcher.py経由で起動している場合は全クラスタの合計
+    server_count = cluster.guild_total(bot)
+    # シャードごとにそのシャードのサーバー数を表示する
+    counts = shard_monitor.guild_counts(bot)
+    for shard_id, count in counts.items():
+        activity = discord.Game(
+            name=f"/help / {BOT_VERSION} / {server_count} servers / shard {shard_id} ({count})"
+        )
+        await bot.change_presence(status=discord.Status.online, activity=activity, shard_id=shard_id)
+    logger.info(f"Status updated: {server_count} servers, per shard: {counts}")
 
 # FastAPIのアプリケーション
 app = webservice.app
@@ -59,31 +81,24 @@ app.add_middleware(
 )
 
 # コマンドリストを取得するためのFastAPIエンドポイント
+# 一覧はbot.treeから作ったものをキャッシュしており (core.catalog)、変わっていなければ304を返す
 @app.get("/commands", response_class=JSONResponse)
-async def get_commands():
-    commands_list = []
-    commands_folder = "./cogs"
-    for file in os.listdir(commands_folder):
-        if file.endswith(".py"):
-            module_name = file[:-3]
-            module_path = os.path.join(commands_folder, file)
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            for name, obj in vars(module).items():
-                if inspect.isclass(obj) and issubclass(obj, commands.Cog):
-                    cog = obj(bot)
-                    for command in cog.__cog_app_commands__:
-                        command_info = {
-                            "name": command.name,
-                            "description": command.description or "説明なし",
-                        }
-                        commands_list.append(command_info)
-    return JSONResponse(content={"commands": commands_list})
+async def get_commands(request: Request):
+    if not command_catalog.ready:
+        # ボットの起動中 (コマンドツリーがまだない)
+        return JSONResponse(
+            status_code=503, content={"commands": []}, headers={"Retry-After": "5"}
+        )
+    body, etag = command_catalog.json()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # FastAPIサーバーを起動するための関数
 def start_webserver():
-    config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
+    # uvicorn独自のログ設定は使わず、ルートロガー (キュー) に流す
+    config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info", log_config=None)
     server = uvicorn.Server(config)
     return server.serve()
 
@@ -93,10 +108,14 @@ async def start_bot():
 
 # 両方のサービスを同時に起動する
 async def start_services():
-    await asyncio.gather(
-        start_bot(),          # Discordボットの起動
-        start_webserver()     # FastAPIサーバーの起動
-    )
+    services = [start_bot()]  # Discordボットの起動
+    # launcher.pyで複数クラスタを起動する場合はクラスタ0だけがFastAPIサーバーを起動する
+    if os.getenv("WEB_ENABLED", "1") == "1":
+        services.append(start_webserver())  # FastAPIサーバーの起動
+    await asyncio.gather(*services)
 
-if __name__ == "__main__":
+def run():
     asyncio.run(start_services())  # メインイベントループで両方のタスクを実行
+
+if __name__ == "__main__":
+    run()
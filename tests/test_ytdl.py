@@ -0,0 +1,23 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+from core.ytdl import cache_key
+
+
+def test_start_time_is_part_of_the_key():
+    # t= は再生開始位置なので、同じ動画でも別のキャッシュにする
+    assert cache_key("stream", "https://www.youtube.com/watch?v=X&t=90") != cache_key(
+        "stream", "https://www.youtube.com/watch?v=X"
+    )
+
+
+def test_share_parameters_are_ignored():
+    assert cache_key("stream", "https://youtu.be/X?si=abc") == cache_key(
+        "stream", "https://m.youtube.com/watch?v=X&feature=share"
+    )
+
+
+def test_other_hosts_keep_their_parameters():
+    assert cache_key("stream", "https://example.com/a.mp3?si=1") != cache_key(
+        "stream", "https://example.com/a.mp3"
+    )
@@ -0,0 +1,110 @@
+# SPDX-License-Identifier: CC-BY-NC-SA-4.0
+# Author: Miriel (@mirielnet)
+
+# 起動時のimport時間とメモリ使用量を計測するスクリプト (python -X importtime を集計します)
+# 使い方:
+#   python tools/importprofile.py              全cogを1つのプロセスで読み込んだときの内訳
+#   python tools/importprofile.py --per-cog    cogごとに別プロセスで読み込んだときの時間
+#   python tools/importprofile.py cogs.music   指定したモジュールだけ
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子プロセスで実行するコード。最後の行に最大RSS (KB) を出力する
+CHILD = """
+import importlib, resource, sys
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+# --per-cog でcogごとの差分を見るために先に読み込んでおく共通の依存
+BASELINE = ("discord", "discord.ext.commands", "discord.app_commands")
+
+
+def cog_modules():
+    return [
+        f"cogs.{filename[:-3]}"
+        for filename in sorted(os.listdir(os.path.join(ROOT, "cogs")))
+        if filename != "__init__.py" and filename.endswith(".py")
+    ]
+
+
+def run(modules):
+    """モジュールを新しいインタプリタで読み込み、(importごとの行, 最大RSS) を返します。"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, *modules],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries, int(result.stdout.strip().splitlines()[-1])
+
+
+def by_package(entries):
+    totals = {}
+    for name, self_us, _ in entries:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def report_startup(modules, top):
+    entries, rss = run(modules)
+    total = sum(self_us for _, self_us, _ in entries)
+    print(f"total import time: {total / 1000:.1f} ms, max RSS: {rss / 1024:.1f} MB")
+    print(f"{'package':<30} {'self ms':>10}")
+    for package, self_us in by_package(entries)[:top]:
+        print(f"{package:<30} {self_us / 1000:>10.1f}")
+
+
+def report_per_cog(modules):
+    try:
+        _, baseline_rss = run(BASELINE)
+    except RuntimeError as e:
+        sys.exit(f"failed to import {', '.join(BASELINE)}: {e}")
+    rows = []
+    for module in modules:
+        try:
+            entries, rss = run([*BASELINE, module])
+        except RuntimeError as e:
+            rows.append((module, None, None, str(e)))
+            continue
+        cumulative = next((cum for name, _, cum in entries if name == module), 0)
+        rows.append((module, cumulative, rss - baseline_rss, ""))
+    rows.sort(key=lambda row: row[1] or 0, reverse=True)
+    print(f"{'module':<30} {'import ms':>10} {'RSS +MB':>10}")
+    for module, cumulative, rss, error in rows:
+        if cumulative is None:
+            print(f"{module:<30} {'failed':>10} {'':>10} {error}")
+        else:
+            print(f"{module:<30} {cumulative / 1000:>10.1f} {rss / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time and memory of the bot's modules")
+    parser.add_argument("modules", nargs="*", help="modules to import (default: core.bot and all cogs)")
+    parser.add_argument("--per-cog", action="store_true", help="import each module in its own process")
+    parser.add_argument("--top", type=int, default=25, help="number of packages to show")
+    args = parser.parse_args()
+
+    if args.per_cog:
+        report_per_cog(args.modules or cog_modules())
+    else:
+        report_startup(args.modules or ["core.bot", *cog_modules()], args.top)
+
+
+if __name__ == "__main__":
+    main()